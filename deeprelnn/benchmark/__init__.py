@@ -0,0 +1,17 @@
+from deeprelnn.benchmark.generator import (
+    KnowledgeBase,
+    generate_knowledge_base,
+)
+from deeprelnn.benchmark.scenarios import (
+    SCENARIOS,
+    format_results,
+    run_benchmarks,
+)
+
+__all__ = [
+    "KnowledgeBase",
+    "SCENARIOS",
+    "format_results",
+    "generate_knowledge_base",
+    "run_benchmarks",
+]
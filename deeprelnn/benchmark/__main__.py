@@ -0,0 +1,69 @@
+"""Benchmark DeepRelNN on a synthetic knowledge base
+
+    python -m deeprelnn.benchmark --facts 100000 --scenarios parse prove
+"""
+import argparse
+import json
+
+from deeprelnn.benchmark import (
+    SCENARIOS,
+    format_results,
+    generate_knowledge_base,
+    run_benchmarks,
+)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m deeprelnn.benchmark")
+    parser.add_argument("--predicates", type=int, default=5)
+    parser.add_argument("--max-arity", type=int, default=2)
+    parser.add_argument("--types", type=int, default=1)
+    parser.add_argument("--constants", type=int, default=1000)
+    parser.add_argument("--facts", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--weighted", type=float, default=0.0)
+    parser.add_argument("--clauses", type=int, default=100)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="skip the tracemalloc run measuring peak memory",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print the results as JSON"
+    )
+    args = parser.parse_args(args)
+    knowledge_base = generate_knowledge_base(
+        n_predicates=args.predicates,
+        max_arity=args.max_arity,
+        n_types=args.types,
+        n_constants=args.constants,
+        n_facts=args.facts,
+        n_samples=args.samples,
+        skew=args.skew,
+        weighted=args.weighted,
+        seed=args.seed,
+    )
+    results = run_benchmarks(
+        knowledge_base,
+        scenarios=args.scenarios,
+        n_clauses=args.clauses,
+        epochs=args.epochs,
+        repeat=args.repeat,
+        memory=not args.no_memory,
+        seed=args.seed,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
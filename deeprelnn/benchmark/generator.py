@@ -0,0 +1,129 @@
+from collections import namedtuple
+
+import numpy as np
+
+KnowledgeBase = namedtuple(
+    "KnowledgeBase", ["background", "facts", "samples", "target"]
+)
+
+
+def _get_probabilities(n_values, skew):
+    # zipf-like popularity, skew 0 is uniform
+    probabilities = 1.0 / np.arange(1, n_values + 1) ** skew
+    return probabilities / probabilities.sum()
+
+
+def generate_knowledge_base(
+    n_predicates=5,
+    max_arity=2,
+    n_types=1,
+    n_constants=1000,
+    n_facts=10000,
+    n_samples=200,
+    skew=1.0,
+    weighted=0.0,
+    seed=None,
+):
+    """Generate a synthetic knowledge base in the format of the model
+
+    Predicates ``p0, p1, ...`` get a random arity up to ``max_arity`` and
+    random argument types ``t0, t1, ...``. Their arguments are drawn from
+    ``n_constants`` constants per type with Zipf-like popularity. The
+    target predicate ``target`` copies the types of the first binary
+    predicate, its positive samples are facts of that predicate and its
+    negative samples random pairs that are not.
+
+    Args:
+        n_predicates (int, optional): Number of body predicates.
+        max_arity (int, optional): Maximum arity of a body predicate.
+        n_types (int, optional): Number of argument types.
+        n_constants (int, optional): Number of constants of each type.
+        n_facts (int, optional): Number of facts, before duplicates are
+            removed.
+        n_samples (int, optional): Number of samples, half positive.
+        skew (float, optional): Exponent of the popularity of the
+            constants, 0 draws them uniformly. Defaults to 1.0.
+        weighted (float, optional): Fraction of facts with a weight
+            below 1. Defaults to 0.0.
+        seed (optional): Seed of the random generator.
+
+    Returns:
+        KnowledgeBase with the background modes, facts, samples and
+        target predicate.
+    """
+    rng = np.random.default_rng(seed)
+    probabilities = _get_probabilities(n_constants, skew)
+    arities = rng.integers(1, max_arity + 1, n_predicates)
+    if max_arity >= 2 and n_predicates and not np.any(arities == 2):
+        arities[0] = 2
+    predicate_types = [rng.integers(0, n_types, arity) for arity in arities]
+
+    background = []
+    facts = set()
+    n_predicate_facts = n_facts // max(n_predicates, 1)
+    for index, types in enumerate(predicate_types):
+        predicate = "p{}".format(index)
+        type_names = ["t{}".format(argument_type) for argument_type in types]
+        background.append("{}({}).".format(
+            predicate, ",".join("+" + name for name in type_names)
+        ))
+        for position in range(len(types)):
+            if len(types) > 1:
+                background.append("{}({}).".format(predicate, ",".join(
+                    ("+" if i == position else "-") + name
+                    for i, name in enumerate(type_names)
+                )))
+        constants = rng.choice(
+            n_constants, (n_predicate_facts, len(types)), p=probabilities
+        )
+        weights = np.where(
+            rng.random(n_predicate_facts) < weighted,
+            np.round(rng.random(n_predicate_facts), 2),
+            1.0,
+        )
+        for arguments, weight in zip(constants.tolist(), weights.tolist()):
+            fact = "{}({}).".format(predicate, ",".join(
+                "c{}_{}".format(argument_type, argument)
+                for argument_type, argument in zip(types, arguments)
+            ))
+            facts.add(fact if weight == 1.0 else "{}::{}".format(weight, fact))
+    facts = sorted(facts)
+
+    # the target relation follows the first binary predicate
+    binary = [
+        index for index, types in enumerate(predicate_types)
+        if len(types) == 2
+    ]
+    target_types = predicate_types[binary[0]] if binary else np.zeros(2, int)
+    background.append("target({}).".format(",".join(
+        "+t{}".format(argument_type) for argument_type in target_types
+    )))
+    positives = []
+    if binary:
+        prefix = "p{}(".format(binary[0])
+        # weighted facts start with their "weight::" prefix, a tuple may
+        # be a fact both with and without a weight
+        positives = list(dict.fromkeys(
+            fact[len(prefix):-2]
+            for fact in (fact.rpartition("::")[2] for fact in facts)
+            if fact.startswith(prefix)
+        ))
+        rng.shuffle(positives)
+        positives = positives[:n_samples // 2]
+    positive_set = set(positives)
+    negatives = []
+    for _ in range(10 * n_samples):
+        if len(negatives) >= n_samples - len(positives):
+            break
+        arguments = ",".join(
+            "c{}_{}".format(argument_type, rng.integers(n_constants))
+            for argument_type in target_types
+        )
+        if arguments not in positive_set:
+            positive_set.add(arguments)
+            negatives.append(arguments)
+    samples = ["target({}).".format(arguments) for arguments in positives]
+    samples += [
+        "0.0::target({}).".format(arguments) for arguments in negatives
+    ]
+    return KnowledgeBase(background, facts, samples, "target")
@@ -0,0 +1,159 @@
+import time
+import tracemalloc
+
+from deeprelnn.factory import ClauseFactory
+from deeprelnn.parser import parse_literals
+from deeprelnn.prover.prover import Prover
+from deeprelnn.prover.trie import ClauseTrie
+from deeprelnn.store import FactStore
+
+
+def _measure(name, function, items, unit, repeat=1, memory=True):
+    """Time the best of ``repeat`` runs and trace one for its peak memory
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+    peak_memory = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {
+        "scenario": name,
+        "seconds": seconds,
+        "items": items,
+        "unit": unit,
+        "throughput": items / seconds if seconds else float("inf"),
+        "peak_memory": peak_memory,
+    }
+
+
+def _get_head_mappings(samples):
+    parsed = parse_literals(samples)
+    offsets = parsed.offsets.tolist()
+    return [
+        {
+            chr(65 + index): [argument]
+            for index, argument in enumerate(parsed.arguments[start:stop])
+        }
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ]
+
+
+def _fit(knowledge_base, clauses, epochs):
+    # tensorflow is only imported when training is benchmarked
+    from deeprelnn.model import DeepRelNN
+
+    DeepRelNN(
+        background=knowledge_base.background,
+        target=knowledge_base.target,
+        clauses=clauses,
+        epochs=epochs,
+    ).fit(knowledge_base.facts, knowledge_base.samples)
+
+
+SCENARIOS = ("parse", "compile", "clauses", "prove", "prove_exact", "fit")
+
+
+def run_benchmarks(
+    knowledge_base,
+    scenarios=SCENARIOS,
+    n_clauses=100,
+    epochs=5,
+    repeat=1,
+    memory=True,
+    seed=0,
+):
+    """Run timed scenarios on a knowledge base
+
+    Args:
+        knowledge_base (KnowledgeBase): facts, modes and samples.
+        scenarios (list, optional): names of the scenarios to run, among
+            ``SCENARIOS``. Defaults to all of them.
+        n_clauses (int, optional): Number of clauses generated, proved
+            and trained on. Defaults to 100.
+        epochs (int, optional): Training epochs. Defaults to 5.
+        repeat (int, optional): Runs timed per scenario, the fastest is
+            reported. Defaults to 1.
+        memory (bool, optional): Run every scenario once more under
+            tracemalloc to report its peak memory. Defaults to True.
+        seed (optional): Seed of the clause generation.
+
+    Returns:
+        List of dicts with the scenario, its best time in ``seconds``,
+        the number of ``items`` processed and their ``unit``, the
+        ``throughput`` in items per second and the ``peak_memory`` in
+        bytes.
+    """
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError("Unknown scenarios {}".format(sorted(unknown)))
+    facts = knowledge_base.facts
+    samples = knowledge_base.samples
+    store = FactStore(facts)
+    clauses = ClauseFactory(
+        knowledge_base.background, store, knowledge_base.target
+    ).get_clauses(n_clauses, seed=seed)
+    trie = ClauseTrie(clauses)
+    head_mappings = _get_head_mappings(samples)
+    functions = {
+        "parse": (
+            lambda: parse_literals(facts), len(facts), "facts",
+        ),
+        "compile": (
+            lambda: FactStore(facts), len(facts), "facts",
+        ),
+        "clauses": (
+            lambda: ClauseFactory(
+                knowledge_base.background, store, knowledge_base.target
+            ).get_clauses(n_clauses, seed=seed),
+            n_clauses,
+            "clauses",
+        ),
+        "prove": (
+            lambda: Prover(store).prove_trie(head_mappings, trie),
+            len(samples) * len(clauses),
+            "clause proofs",
+        ),
+        "prove_exact": (
+            lambda: Prover(store, exact=True).prove_trie(head_mappings, trie),
+            len(samples) * len(clauses),
+            "clause proofs",
+        ),
+        "fit": (
+            lambda: _fit(knowledge_base, clauses, epochs),
+            len(samples),
+            "samples",
+        ),
+    }
+    return [
+        _measure(name, *functions[name], repeat=repeat, memory=memory)
+        for name in SCENARIOS
+        if name in scenarios
+    ]
+
+
+def format_results(results):
+    """Render benchmark results as a text table
+    """
+    lines = ["{:<12} {:>10} {:>14} {:>22} {:>12}".format(
+        "scenario", "seconds", "items", "throughput", "peak MiB"
+    )]
+    for result in results:
+        peak_memory = result["peak_memory"]
+        lines.append("{:<12} {:>10.4f} {:>14} {:>22} {:>12}".format(
+            result["scenario"],
+            result["seconds"],
+            result["items"],
+            "{:.1f} {}/s".format(result["throughput"], result["unit"]),
+            "-" if peak_memory is None else "{:.1f}".format(
+                peak_memory / 2 ** 20
+            ),
+        ))
+    return "\n".join(lines)
@@ -1,7 +1,10 @@
 import random
 
+import numpy as np
+
 from deeprelnn.fol import Constant, Literal, Predicate, Variable
 from deeprelnn.parser import get_constants, get_modes
+from deeprelnn.store import FactStore
 
 
 class VariableFactory:
@@ -30,6 +33,49 @@ class VariableFactory:
         return Variable(variable)
 
 
+def get_canonical_clause(clause, head_variables=()):
+    """Rename the body variables of a clause in order of appearance
+
+    Head variables and "_" keep their names and the others are named as
+    ``VariableFactory`` would, so clauses differing only in how their
+    body variables are named get the same literals. Literals are not
+    reordered since every prefix of a clause is a feature.
+
+    Args:
+        clause (list): literals of the clause body.
+        head_variables (list): variables bound by the head.
+    """
+    variable_factory = VariableFactory(head_variables)
+    variables = {variable.name: variable for variable in head_variables}
+    variables["_"] = Variable("_")
+    canonical = []
+    for literal in clause:
+        arguments = []
+        for argument in literal.arguments:
+            if isinstance(argument, Variable):
+                if argument.name not in variables:
+                    variables[argument.name] = \
+                        variable_factory.get_new_variable()
+                argument = variables[argument.name]
+            arguments.append(argument)
+        canonical.append(Literal(literal.predicate, arguments))
+    return canonical
+
+
+def _get_variable_name(number):
+    """Name ``VariableFactory`` gives to its ``number``-th variable
+    """
+    if number > 25:
+        return "Var{}".format(number - 25)
+    return chr(65 + number)
+
+
+def _get_variable_number(name):
+    if name.startswith("Var"):
+        return int(name[3:]) + 25
+    return ord(name) - 65
+
+
 class ClauseFactory:
     def __init__(
         self,
@@ -42,11 +88,68 @@ class ClauseFactory:
     ):
         self._modes = get_modes(modes)
         self._constants = get_constants(self._modes, facts)
+        self._facts = facts
         self._target = target
         self._reset_variables()
         self._max_literals = max_literals
         self._max_cycles = max_cycles
         self._allow_recursion = allow_recursion
+        self._compile_tables()
+
+    def _compile_tables(self):
+        """Precompute the arrays drawn from by ``get_clauses``
+
+        Argument types, constants and the head variables are numbered so
+        that mode compatibility is a boolean table and every argument of
+        every mode can be drawn for a whole batch of clauses at once.
+        """
+        types = {}
+        for _, *arguments in self._modes:
+            for _, argument_type in arguments:
+                types.setdefault(argument_type, len(types))
+        n_modes = len(self._modes)
+        max_arity = max([len(mode) - 1 for mode in self._modes] + [0])
+        # kind of every argument: 0 "+", 1 "-", 2 "`", 3 "#", -1 padding
+        self._argument_kinds = np.full((n_modes, max_arity), -1)
+        self._argument_types = np.zeros((n_modes, max_arity), dtype=int)
+        self._required_types = np.zeros((n_modes, len(types)), dtype=bool)
+        predicates = {}
+        self._mode_predicates = np.zeros(n_modes, dtype=int)
+        self._allowed_modes = np.ones(n_modes, dtype=bool)
+        for index, (predicate, *arguments) in enumerate(self._modes):
+            self._mode_predicates[index] = predicates.setdefault(
+                predicate, len(predicates)
+            )
+            if not self._allow_recursion and predicate == self._target:
+                self._allowed_modes[index] = False
+            for position, (mode, argument_type) in enumerate(arguments):
+                self._argument_kinds[index, position] = "+-`#".index(mode)
+                self._argument_types[index, position] = types[argument_type]
+                if mode == "+":
+                    self._required_types[index, types[argument_type]] = True
+        self._predicates = [Predicate(predicate) for predicate in predicates]
+        # constants and head variables of every type, flattened
+        constants = []
+        self._constant_counts = np.zeros(len(types), dtype=int)
+        for argument_type, type_index in types.items():
+            type_constants = sorted(self._constants.get(argument_type, ()))
+            constants.extend(type_constants)
+            self._constant_counts[type_index] = len(type_constants)
+        self._constant_offsets = np.cumsum(self._constant_counts) - \
+            self._constant_counts
+        # terms are created when a literal uses them
+        self._constant_names = constants
+        self._head_counts = np.zeros(len(types), dtype=int)
+        head_numbers = []
+        for argument_type, type_index in types.items():
+            variables = self._head_variables.get(argument_type, [])
+            self._head_counts[type_index] = len(variables)
+            head_numbers.extend(
+                _get_variable_number(variable.name) for variable in variables
+            )
+        self._head_offsets = np.cumsum(self._head_counts) - self._head_counts
+        self._head_numbers = np.array(head_numbers, dtype=int)
+        self._n_head_variables = len(head_numbers)
 
     def _get_potential_modes_indexes(self, head_variables, body_variables):
         potential_modes = []
@@ -115,6 +218,158 @@ class ClauseFactory:
         self._head_variables = self._set_target()
         self._body_variables = {}
 
+    def _draw_literals(self, rng, state, rows):
+        """Draw one literal for each of ``rows`` and bind its arguments
+        """
+        available = state["available"][rows]
+        potential = self._allowed_modes & ~np.any(
+            self._required_types & ~available[:, None, :], axis=2
+        )
+        counts = potential.sum(axis=1)
+        if not counts.all():
+            raise IndexError("Cannot choose from an empty sequence")
+        choices = (rng.random(len(rows)) * counts).astype(int)
+        modes = np.argmax(
+            np.cumsum(potential, axis=1) > choices[:, None], axis=1
+        )
+        kinds = self._argument_kinds[modes]
+        types = self._argument_types[modes]
+        # literal key: predicate and, per argument, the variable number
+        # or the negated constant index, -1 pads shorter literals
+        keys = np.full((len(rows), 1 + kinds.shape[1]), -1)
+        keys[:, 0] = self._mode_predicates[modes]
+        for position in range(kinds.shape[1]):
+            kind, argument_type = kinds[:, position], types[:, position]
+            valid = kind >= 0
+            n_head = np.where(kind <= 1, self._head_counts[argument_type], 0)
+            n_body = np.where(
+                kind <= 2, state["body_counts"][rows, argument_type], 0
+            )
+            n_new = ((kind == 1) | (kind == 2)).astype(int)
+            n_constants = np.where(
+                kind == 3, self._constant_counts[argument_type], 0
+            )
+            totals = n_new + n_head + n_body + n_constants
+            if np.any(valid & (totals == 0)):
+                raise IndexError("Cannot choose from an empty sequence")
+            draws = (rng.random(len(rows)) * totals).astype(int)
+            codes = np.full(len(rows), -1)
+            constant = valid & (kind == 3)
+            codes[constant] = -2 - (
+                self._constant_offsets[argument_type[constant]]
+                + draws[constant]
+            )
+            draws = draws - n_new
+            head = valid & (kind != 3) & (draws >= 0) & (draws < n_head)
+            codes[head] = self._head_numbers[
+                self._head_offsets[argument_type[head]] + draws[head]
+            ]
+            body = valid & (kind != 3) & (draws >= n_head)
+            codes[body] = state["body_numbers"][
+                rows[body], argument_type[body], (draws - n_head)[body]
+            ]
+            new = valid & (kind != 3) & (draws < 0)
+            new_rows, new_types = rows[new], argument_type[new]
+            codes[new] = state["next_numbers"][new_rows]
+            state["body_numbers"][
+                new_rows, new_types, state["body_counts"][new_rows, new_types]
+            ] = codes[new]
+            state["body_counts"][new_rows, new_types] += 1
+            state["available"][new_rows, new_types] = True
+            state["next_numbers"][new_rows] += 1
+            keys[:, 1 + position] = codes
+        return keys
+
+    def _get_literal(self, key):
+        arguments = []
+        for code in key[1:]:
+            if code == -1:
+                break
+            if code < -1:
+                arguments.append(Constant(self._constant_names[-2 - code]))
+            else:
+                arguments.append(Variable(_get_variable_name(code)))
+        return Literal(self._predicates[key[0]], arguments)
+
+    def _generate_keys(self, rng, n):
+        """Literal keys of ``n`` clauses, shape (n, max_literals, width)
+        """
+        n_types = len(self._head_counts)
+        max_new = self._max_literals * self._argument_kinds.shape[1]
+        state = {
+            "available": np.tile(self._head_counts > 0, (n, 1)),
+            "body_counts": np.zeros((n, n_types), dtype=int),
+            "body_numbers": np.zeros((n, n_types, max_new), dtype=int),
+            "next_numbers": np.full(n, self._n_head_variables),
+        }
+        keys = np.zeros(
+            (n, self._max_literals, 1 + self._argument_kinds.shape[1]),
+            dtype=np.int64,
+        )
+        for index in range(self._max_literals):
+            rows = np.arange(n)
+            for _ in range(self._max_cycles + 1):
+                keys[rows, index] = self._draw_literals(rng, state, rows)
+                # avoid repetitions, literals with new variables never
+                # repeat so redrawing does not leave dangling variables
+                repeated = np.any(
+                    np.all(
+                        keys[rows, :index] == keys[rows, index][:, None],
+                        axis=2,
+                    ),
+                    axis=1,
+                )
+                rows = rows[repeated]
+                if not len(rows):
+                    break
+        return keys
+
+    def get_clauses(self, n, unique=True, seed=None):
+        """Generate ``n`` clauses at once
+
+        Every random choice of ``get_clause`` is drawn for the whole
+        batch with numpy instead of one clause at a time.
+
+        Args:
+            n (int): Number of clauses.
+            unique (bool, optional): Skip clauses already generated, in
+                which case fewer than ``n`` clauses are returned when
+                ``max_cycles`` batches do not yield enough new ones.
+                Defaults to True.
+            seed (optional): Seed of the numpy generator. Defaults to
+                None, i.e. drawn from the ``random`` module.
+
+        Returns:
+            List of clauses, each a list of literals.
+        """
+        rng = np.random.default_rng(
+            random.getrandbits(64) if seed is None else seed
+        )
+        clause_keys = []
+        seen = set()
+        for _ in range(self._max_cycles if unique else 1):
+            missing = n - len(clause_keys)
+            if missing <= 0:
+                break
+            for key in self._generate_keys(rng, missing):
+                if unique:
+                    digest = key.tobytes()
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                clause_keys.append(key)
+        literals = {}
+        clauses = []
+        for key in clause_keys:
+            clause = []
+            for literal_key in key:
+                literal_key = tuple(literal_key.tolist())
+                if literal_key not in literals:
+                    literals[literal_key] = self._get_literal(literal_key)
+                clause.append(literals[literal_key])
+            clauses.append(clause)
+        return clauses
+
     def get_clause(self):
         self._reset_variables()
         literals = []
@@ -129,3 +384,117 @@ class ClauseFactory:
             literals_set.add(str(literal))
             literals.append(literal)
         return literals
+
+    def _get_store(self):
+        if not isinstance(self._facts, FactStore):
+            self._facts = FactStore(self._facts)
+        return self._facts
+
+    def _get_seeded_literal(self, rng, store, bindings):
+        """Literal true for the seed, drawn from a fact it reaches
+        """
+        potential_modes_indexes = self._get_potential_modes_indexes(
+            self._head_variables,
+            self._body_variables
+        )
+        predicate, *mode_arguments = self._modes[
+            rng.choice(potential_modes_indexes)
+        ]
+        if predicate not in store:
+            return None
+        relation = store[predicate]
+        arguments = [None] * len(mode_arguments)
+        literal_mapping = {}
+        for i, (mode_type, argument_type) in enumerate(mode_arguments):
+            if mode_type == "+":
+                arguments[i] = rng.choice(
+                    self._head_variables.get(argument_type, [])
+                    + self._body_variables.get(argument_type, [])
+                )
+                literal_mapping[i] = np.array([bindings[arguments[i].name]])
+        rows = relation.select(literal_mapping)
+        if not len(rows):
+            return None
+        row = rows[rng.randrange(len(rows))]
+        for i, (mode_type, argument_type) in enumerate(mode_arguments):
+            value = int(relation.columns[i][row])
+            if mode_type == "#":
+                arguments[i] = Constant(store.decode([value])[0])
+            if mode_type in "-`":
+                variables = self._body_variables.get(argument_type, [])
+                if mode_type == "-":
+                    variables = self._head_variables.get(
+                        argument_type, []
+                    ) + variables
+                # reuse a variable only if the fact binds it to its value
+                new_argument = rng.choice([None] + [
+                    variable
+                    for variable in variables
+                    if bindings[variable.name] == value
+                ])
+                if new_argument is None:
+                    new_argument = self._variable_factory.get_new_variable()
+                    self._body_variables.setdefault(
+                        argument_type, []
+                    ).append(new_argument)
+                    bindings[new_argument.name] = value
+                arguments[i] = new_argument
+        return Literal(Predicate(predicate), arguments)
+
+    def get_seeded_clause(self, head_mapping, rng=random):
+        """Clause whose literals hold for the example ``head_mapping``
+
+        Every literal is taken from a fact reached from the constants of
+        the example through the arguments bound so far, so the example
+        proves every literal of the clause. The clause is shorter than
+        ``max_literals`` when no new literal can be found.
+
+        Args:
+            head_mapping (dict): head variable name -> [constant].
+        """
+        store = self._get_store()
+        self._reset_variables()
+        bindings = {
+            variable.name: int(
+                store.encode(head_mapping.get(variable.name, [None])[:1])[0]
+            )
+            for variables in self._head_variables.values()
+            for variable in variables
+        }
+        literals = []
+        literals_set = set()
+        for i in range(self._max_literals):
+            for _ in range(self._max_cycles):
+                literal = self._get_seeded_literal(rng, store, bindings)
+                if literal is not None and str(literal) not in literals_set:
+                    break
+            else:
+                break
+            literals_set.add(str(literal))
+            literals.append(literal)
+        return literals
+
+    def get_seeded_clauses(self, head_mappings, n, seed=None):
+        """Generate up to ``n`` distinct clauses seeded by examples
+
+        Args:
+            head_mappings (list): head mappings of the seed examples,
+                usually the positive ones, each seeds a clause in turn.
+            n (int): Number of clauses.
+            seed (optional): Seed of the random generator. Defaults to
+                None, i.e. drawn from the ``random`` module.
+        """
+        rng = random.Random(random.getrandbits(64) if seed is None else seed)
+        clauses = []
+        clauses_set = set()
+        if not len(head_mappings):
+            return clauses
+        for _ in range(n * self._max_cycles):
+            if len(clauses) >= n:
+                break
+            clause = self.get_seeded_clause(rng.choice(head_mappings), rng)
+            key = ", ".join(str(literal) for literal in clause)
+            if clause and key not in clauses_set:
+                clauses_set.add(key)
+                clauses.append(clause)
+        return clauses
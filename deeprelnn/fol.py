@@ -1,17 +1,39 @@
-import re
+import weakref
 
 
 class Term:
-    def __init__(self, name):
-        self.name = name
+    """Named term, interned so that equal terms are the same object.
+
+    Terms are immutable and compared by identity, their hash is computed
+    once when they are first created. The intern tables only hold weak
+    references, terms no longer used anywhere are freed.
+    """
+    __slots__ = ("name", "_hash", "__weakref__")
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name):
+        term = cls._instances.get(name)
+        if term is None:
+            term = super().__new__(cls)
+            term.name = name
+            term._hash = hash((cls.__name__, name))
+            # setdefault keeps a single instance if two threads race
+            term = cls._instances.setdefault(name, term)
+        return term
+
+    def __reduce__(self):
+        return self.__class__, (self.name,)
+
+    def __hash__(self):
+        return self._hash
 
     def is_grounded(self):
         return not self.contains_variables()
 
 
 class Variable(Term):
-    def __init__(self, name):
-        super().__init__(name)
+    __slots__ = ()
+    _instances = weakref.WeakValueDictionary()
 
     def contains_variables(self):
         return True
@@ -22,14 +44,13 @@ class Variable(Term):
     def __str__(self):
         return self.name
 
-    def __eq__(self, other):
-        return repr(self) == repr(other)
-
 
 class Constant(Term):
-    def __init__(self, name):
-        name = re.sub('"', "", name)
-        super().__init__(name)
+    __slots__ = ()
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name):
+        return super().__new__(cls, name.replace('"', ""))
 
     def contains_variables(self):
         return False
@@ -40,13 +61,27 @@ class Constant(Term):
     def __str__(self):
         return '"{}"'.format(self.name)
 
-    def __eq__(self, other):
-        return repr(self) == repr(other)
-
 
 class Predicate:
-    def __init__(self, name):
-        self.name = name
+    """Predicate name, interned like terms
+    """
+    __slots__ = ("name", "_hash", "__weakref__")
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name):
+        predicate = cls._instances.get(name)
+        if predicate is None:
+            predicate = super().__new__(cls)
+            predicate.name = name
+            predicate._hash = hash((cls.__name__, name))
+            predicate = cls._instances.setdefault(name, predicate)
+        return predicate
+
+    def __reduce__(self):
+        return self.__class__, (self.name,)
+
+    def __hash__(self):
+        return self._hash
 
     def __repr__(self):
         return "Predicate({})".format(self.name)
@@ -54,11 +89,10 @@ class Predicate:
     def __str__(self):
         return "{}".format(self.name)
 
-    def __eq__(self, other):
-        return repr(self) == repr(other)
-
 
 class Atom:
+    __slots__ = ("predicate", "arguments", "weight")
+
     def __init__(self, predicate, arguments=[], weight=1.0):
         self.predicate = predicate
         self.arguments = arguments
@@ -66,6 +100,8 @@ class Atom:
 
 
 class Literal(Atom):
+    __slots__ = ()
+
     def __init__(self, predicate, arguments=[]):
         super().__init__(predicate, arguments)
 
@@ -82,4 +118,12 @@ class Literal(Atom):
         )
 
     def __eq__(self, other):
-        return repr(self) == repr(other)
+        # interned terms compare by identity, lists compare them in C
+        return (
+            isinstance(other, Literal)
+            and self.predicate is other.predicate
+            and self.arguments == other.arguments
+        )
+
+    def __hash__(self):
+        return hash((self.predicate, tuple(self.arguments)))
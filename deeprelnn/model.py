@@ -1,10 +1,96 @@
+import multiprocessing
+import os
+from contextlib import contextmanager, nullcontext
+
 import numpy as np
+import scipy.sparse
+import tensorflow as tf
 from tensorflow.keras.layers import Dense, Dropout
 from tensorflow.keras.models import Sequential
+from tensorflow.keras.utils import Sequence
 
-from deeprelnn.factory import ClauseFactory
-from deeprelnn.parser import get_literal
+from deeprelnn.factory import ClauseFactory, get_canonical_clause
+from deeprelnn.fol import Variable
+from deeprelnn.parser import get_modes, parse_literals
+from deeprelnn.profiling import Profiler
+from deeprelnn.prover.cache import FeatureCache
 from deeprelnn.prover.prover import Prover
+from deeprelnn.prover.trie import ClauseTrie
+from deeprelnn.store import FactStore, get_fingerprint
+
+# state inherited (fork) or received once (spawn) by the proving workers
+_worker_prover = None
+_worker_trie = None
+_worker_sparse = False
+
+
+def _set_worker_state(prover, trie, sparse=False):
+    global _worker_prover, _worker_trie, _worker_sparse
+    _worker_prover = prover
+    _worker_trie = trie
+    _worker_sparse = sparse
+
+
+def _prove_shard(head_mappings):
+    return _worker_prover.prove_trie(
+        head_mappings, _worker_trie, sparse=_worker_sparse
+    )
+
+
+def _relu(x):
+    np.maximum(x, 0.0, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1.0
+    np.reciprocal(x, out=x)
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+
+
+# in-place activations of the dense layers evaluated by score_one
+_ACTIVATIONS = {
+    "linear": lambda x: None,
+    "relu": _relu,
+    "sigmoid": _sigmoid,
+    "tanh": lambda x: np.tanh(x, out=x),
+    "softmax": _softmax,
+}
+
+
+class SparseBatches(Sequence):
+    """Feed a sparse feature matrix to Keras one dense batch at a time
+    """
+    def __init__(self, X, y=None, batch_size=32, shuffle=False):
+        super().__init__()
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self._order = np.arange(X.shape[0])
+        if shuffle:
+            np.random.shuffle(self._order)
+
+    def __len__(self):
+        return int(np.ceil(self.X.shape[0] / self.batch_size))
+
+    def __getitem__(self, index):
+        batch = self._order[
+            index * self.batch_size:(index + 1) * self.batch_size
+        ]
+        if self.y is None:
+            return (self.X[batch].toarray(),)
+        return self.X[batch].toarray(), self.y[batch]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            np.random.shuffle(self._order)
 
 
 class DeepRelNN:
@@ -22,6 +108,17 @@ class DeepRelNN:
         epochs: int = 200,
         batch_size: int = 32,
         verbose: int = 0,
+        n_jobs: int = 1,
+        sparse: bool = False,
+        chunk_size: int = None,
+        clauses: list = None,
+        feature_cache=None,
+        clause_generation: str = "random",
+        screening_size: int = None,
+        max_bindings: int = None,
+        max_rows: int = None,
+        exact: bool = False,
+        profile: bool = False,
         # predicate_ratio: float = 0.5,
         # sample_ratio: float = 0.5,
     ):
@@ -37,6 +134,49 @@ class DeepRelNN:
             number_of_cycles (int, optional): Maximum number of times
                 the code will loop to learn clauses, increments even
                 if no new clauses are learned. Defaults to 100.
+            n_jobs (int, optional): Number of processes used to prove
+                the clauses, -1 uses every core. Defaults to 1.
+            sparse (bool, optional): Prove into a CSR matrix and train
+                and predict on it batch by batch. Defaults to False.
+            chunk_size (int, optional): Prove and feed the samples in
+                chunks of this size while training and predicting, so
+                the whole feature matrix is never held in memory. The
+                next chunk is proved while the current one is trained
+                on, at the cost of proving again on every epoch.
+                Defaults to None, i.e. prove everything up front.
+            clauses (list, optional): Fixed clauses to use instead of
+                generating new ones on every fit, e.g. the ``clauses_``
+                of a previous fit. Like generated clauses, they are kept
+                in canonical form and only once. Defaults to None.
+            feature_cache (optional): Reuse the feature columns of the
+                clauses already proved for the same facts and samples.
+                True keeps them in memory across fits, a directory path
+                keeps them on disk and a FeatureCache is used as is.
+                Chunked proving does not use it. Defaults to None.
+            clause_generation (str, optional): "random" draws modes and
+                constants uniformly, "seeded" builds every clause from
+                the facts reachable from a positive example, so that it
+                covers at least that example. Defaults to "random".
+            screening_size (int, optional): Prove the clauses on a
+                stratified subsample of this many samples first and
+                drop those whose features are all zero or constant on
+                it. Statistics are kept in ``screening_``. Defaults to
+                None, i.e. keep every clause.
+            max_bindings (int, optional): Maximum number of constants
+                bound to a variable of a clause for a sample, see
+                Prover. Defaults to None, i.e. no limit.
+            max_rows (int, optional): Maximum number of facts matched
+                by a literal for a sample, see Prover. Defaults to None,
+                i.e. no limit.
+            exact (bool, optional): Prove clauses as joins over the
+                co-bound variables instead of binding every variable
+                independently, see Prover. Defaults to False.
+            profile (bool, optional): Time the stages of ``fit`` and
+                ``predict_proba`` and the literals of every clause
+                proved, with their scanned rows and bindings. The
+                report of the last call is kept in ``profile_``, see
+                Profiler. Literals proved by worker processes are not
+                recorded. Defaults to False.
             predicate_ratio (float, optional): Proportion of
                 considering a predicate in the search space.
                 Defaults to 0.5.
@@ -53,10 +193,28 @@ class DeepRelNN:
         self.epochs = epochs
         self.batch_size = batch_size
         self.verbose = verbose
+        self.n_jobs = n_jobs
+        self.sparse = sparse
+        self.chunk_size = chunk_size
+        self.clauses = clauses
+        self.feature_cache = feature_cache
+        self.clause_generation = clause_generation
+        self.screening_size = screening_size
+        self.max_bindings = max_bindings
+        self.max_rows = max_rows
+        self.exact = exact
+        self.profile = profile
         # self.predicate_ratio = predicate_ratio
         # self.sample_ratio = sample_ratio
         self.clauses_ = None
         self.estimator_ = None
+        self.prover_ = None
+        self.facts_fingerprint_ = None
+        self.feature_cache_ = None
+        self.screening_ = None
+        self.profile_ = None
+        self._scorer = None
+        self._profiler = None
 
     def _check_params(self):
         if self.target == "None":
@@ -71,6 +229,11 @@ class DeepRelNN:
             raise ValueError(
                 "background must be set, cannot be {0}".format(self.background)
             )
+        if self.clause_generation not in ("random", "seeded"):
+            raise ValueError(
+                "clause_generation must be random or seeded, cannot be "
+                "{0}".format(self.clause_generation)
+            )
 
     def _check_is_fitted(self):
         if self.estimator_ is None:
@@ -78,63 +241,477 @@ class DeepRelNN:
 
     def fit(self, facts, X):
         """Learn structure and parameters
+
+        Args:
+            facts: Fact strings or any iterable of them, the path of a
+                (gzip) fact file, a compiled FactStore or a Prover.
+            X: Sample strings of the target predicate.
         """
         # check parameters
         self._check_params()
+        self._scorer = None
+
+        with self._profiling():
+            # generate clauses
+            with self._stage("compile"):
+                prover = self._get_prover(facts)
+            # samples are read again when seeding or screening clauses
+            X = X if isinstance(X, (list, tuple)) else list(X)
+            with self._stage("clauses"):
+                if self.clauses is not None:
+                    clauses = self.clauses
+                else:
+                    clauses = self._get_clauses(prover, X)
+                self.clauses_ = self._get_unique_clauses(clauses)
+            if self.screening_size:
+                with self._stage("screening"):
+                    self.clauses_ = self._screen_clauses(prover, X)
+            self._count("samples", len(X))
+            self._count("clauses", len(self.clauses_))
+
+            if self.chunk_size:
+                head_mappings, y_train = self._get_head_mappings(X)
+                model, params = self._get_estimator(
+                    ClauseTrie(self.clauses_).n_columns
+                )
+                params.pop("batch_size")
+                # chunks are proved while training
+                with self._stage("train"):
+                    model.fit(
+                        self._get_dataset(prover, head_mappings, y_train),
+                        **params
+                    )
+                self.estimator_ = model
+                return self
+
+            # compile feature and target vectors
+            with self._stage("prove"):
+                X_train, y_train = self._prove(prover, X)
+                X_train = self._get_X(X_train)
+                y_train = self._get_y(y_train)
+
+            # get estimator and fit it
+            with self._stage("train"):
+                model, params = self._get_estimator(X_train.shape[1])
+                if scipy.sparse.issparse(X_train):
+                    batch_size = params.pop("batch_size")
+                    model.fit(
+                        SparseBatches(
+                            X_train, y_train, batch_size, shuffle=True
+                        ),
+                        **params
+                    )
+                else:
+                    model.fit(X_train, y_train, **params)
+            self.estimator_ = model
+
+        return self
+
+    @contextmanager
+    def _profiling(self):
+        """Record a fit or predict in ``profile_`` when profiling
+        """
+        if not self.profile:
+            self.profile_ = None
+            yield
+            return
+        self._profiler = Profiler()
+        try:
+            with self._profiler.stage("total"):
+                yield
+        finally:
+            if self.prover_ is not None:
+                self.prover_.profiler = None
+            self.profile_ = self._profiler.report()
+            self._profiler = None
 
-        # generate clauses
+    def _stage(self, name):
+        if self._profiler is None:
+            return nullcontext()
+        return self._profiler.stage(name)
+
+    def _count(self, name, value):
+        if self._profiler is not None:
+            self._profiler.count(name, value)
+
+    def _get_clauses(self, prover, samples):
         factory = ClauseFactory(
             self.background,
-            facts,
+            prover.facts,
             self.target,
             max_literals=self.number_of_literals,
             max_cycles=self.number_of_cycles,
             allow_recursion=self.allow_recursion)
-        self.clauses_ = [
-            factory.get_clause()
-            for _ in range(self.number_of_clauses)
-        ]
+        if self.clause_generation == "seeded":
+            head_mappings, y = self._get_head_mappings(samples)
+            return factory.get_seeded_clauses(
+                [
+                    head_mapping
+                    for head_mapping, weight in zip(head_mappings, y)
+                    if weight == 1.0
+                ],
+                self.number_of_clauses,
+            )
+        return factory.get_clauses(self.number_of_clauses)
 
-        # compile feature and target vectors
-        X_train, y_train = self._prove(facts, X)
-        X_train = self._get_X(X_train)
-        y_train = self._get_y(y_train)
+    def _get_unique_clauses(self, clauses):
+        """Canonical form of the clauses, without equivalent copies
+        """
+        head_variables = []
+        for predicate, *arguments in get_modes(self.background):
+            if predicate == self.target:
+                head_variables = [
+                    Variable(chr(65 + index))
+                    for index in range(len(arguments))
+                ]
+                break
+        unique_clauses = {}
+        for clause in clauses:
+            clause = get_canonical_clause(clause, head_variables)
+            unique_clauses.setdefault(
+                ", ".join(str(literal) for literal in clause), clause
+            )
+        return list(unique_clauses.values())
 
-        # get estimator and fit it
-        model, params = self._get_estimator(X_train)
-        model.fit(X_train, y_train, **params)
-        self.estimator_ = model
+    def _get_stratified_sample(self, y):
+        """Indexes of at most ``screening_size`` samples, per label
 
-        return self
+        Samples are allotted to the labels in proportion to their counts
+        by largest remainder, with at least one per label when the size
+        allows it.
+        """
+        y = np.array(y)
+        strata = np.zeros(len(y)) if self.is_regression else y == 1.0
+        size = min(self.screening_size, len(y))
+        labels, inverse, totals = np.unique(
+            strata, return_inverse=True, return_counts=True
+        )
+        quotas = size * totals / len(y)
+        counts = np.floor(quotas).astype(int)
+        minimum = 1 if size >= len(labels) else 0
+        counts = np.maximum(counts, minimum)
+        while counts.sum() < size:
+            counts[np.argmax(quotas - counts)] += 1
+        while counts.sum() > size:
+            counts[np.argmax(
+                np.where(counts > minimum, counts - quotas, -np.inf)
+            )] -= 1
+        sample = [np.zeros(0, dtype=int)]
+        for label, count in enumerate(counts):
+            sample.append(np.random.choice(
+                np.flatnonzero(inverse == label), count, replace=False
+            ))
+        return np.sort(np.concatenate(sample))
+
+    def _screen_clauses(self, prover, samples):
+        """Drop the clauses whose features are constant on a subsample
+        """
+        head_mappings, y = self._get_head_mappings(samples)
+        sample = self._get_stratified_sample(y)
+        X = self._prove_head_mappings(
+            prover, [head_mappings[index] for index in sample]
+        )
+        if scipy.sparse.issparse(X):
+            X = X.toarray()
+        clauses = []
+        zero_coverage = constant = start = 0
+        for clause in self.clauses_:
+            columns = X[:, start:start + len(clause)]
+            start += len(clause)
+            if not columns.any():
+                zero_coverage += 1
+            elif np.all(columns == columns[:1]):
+                constant += 1
+            else:
+                clauses.append(clause)
+        # keep every clause rather than none
+        clauses = clauses or self.clauses_
+        self.screening_ = {
+            "n_samples": len(sample),
+            "n_clauses": len(self.clauses_),
+            "zero_coverage": zero_coverage,
+            "constant": constant,
+            "kept": len(clauses),
+        }
+        return clauses
 
     def predict_proba(self, facts, X):
         self._check_is_fitted()
-        X_pred, _ = self._prove(facts, X)
-        X_pred = self._get_X(X_pred)
-        return self.estimator_.predict(X_pred)[:, 1]
+        with self._profiling():
+            with self._stage("compile"):
+                prover = self._get_prover(facts)
+            if self.chunk_size:
+                head_mappings, y = self._get_head_mappings(X)
+                self._count("samples", len(head_mappings))
+                # chunks are proved while predicting
+                with self._stage("predict"):
+                    return np.concatenate([np.zeros(0)] + [
+                        self.estimator_.predict(X_chunk)[:, 1]
+                        for X_chunk, _ in self._iter_prove(
+                            prover, head_mappings, y
+                        )
+                    ])
+            with self._stage("prove"):
+                X_pred, y = self._prove(prover, X)
+                X_pred = self._get_X(X_pred)
+            self._count("samples", len(y))
+            with self._stage("predict"):
+                if scipy.sparse.issparse(X_pred):
+                    X_pred = SparseBatches(X_pred, batch_size=self.batch_size)
+                return self.estimator_.predict(X_pred)[:, 1]
 
-    def _prove(self, facts, samples):
-        X = []
-        y = []
-        prover = Prover(facts)
-        for sample in samples:
-            weight, predicate, arguments = get_literal(sample)
-            # check predicate is not target
-            if predicate != self.target:
-                raise ValueError("Sample predicate is not target")
-            head_mapping = {
+    def score_one(self, sample, facts=None):
+        """Probability of a single sample, for low latency scoring
+
+        The warm prover of the last fit or predict is reused and the
+        network is evaluated with numpy on buffers allocated on the
+        first call.
+
+        Args:
+            sample (str): Sample string of the target predicate.
+            facts (optional): Facts to prove the sample against, as
+                taken by ``fit``. Defaults to None, i.e. the facts the
+                model was last used with.
+        """
+        self._check_is_fitted()
+        prover = self.prover_ if facts is None else self._get_prover(facts)
+        trie, features, layers = self._get_scorer()
+        head_mappings, _ = self._get_head_mappings([sample])
+        prover.prove_trie(head_mappings, trie, out=features)
+        if layers is None:
+            return float(self.estimator_(features, training=False)[0, 1])
+        x = features
+        for kernel, bias, activation, output in layers:
+            np.matmul(x, kernel, out=output)
+            output += bias
+            activation(output)
+            x = output
+        return float(x[0, 1])
+
+    def _get_scorer(self):
+        """Trie, feature buffer and numpy layers used by ``score_one``
+        """
+        if self._scorer is None:
+            layers = []
+            for layer in self.estimator_.layers:
+                if isinstance(layer, Dropout):
+                    continue
+                activation = getattr(
+                    getattr(layer, "activation", None), "__name__", None
+                )
+                if (
+                    not isinstance(layer, Dense)
+                    or activation not in _ACTIVATIONS
+                ):
+                    # let keras run networks numpy cannot
+                    layers = None
+                    break
+                kernel, bias = layer.get_weights()
+                layers.append((
+                    kernel.astype(np.float64),
+                    bias.astype(np.float64),
+                    _ACTIVATIONS[activation],
+                    np.zeros((1, kernel.shape[1])),
+                ))
+            trie = ClauseTrie(self.clauses_)
+            self._scorer = (trie, np.zeros((1, trie.n_columns)), layers)
+        return self._scorer
+
+    def _get_prover(self, facts):
+        """Reuse the compiled prover while the facts do not change
+        """
+        if isinstance(facts, Prover):
+            if facts is not self.prover_:
+                # a given prover keeps its own budgets
+                self.prover_, self.facts_fingerprint_ = facts, None
+            self.prover_.profiler = self._profiler
+            return self.prover_
+        if isinstance(facts, FactStore):
+            if self.prover_ is None or self.prover_.facts is not facts:
+                self.prover_, self.facts_fingerprint_ = Prover(facts), None
+        elif isinstance(facts, str):
+            # a path to a fact file, streamed while it is compiled
+            status = os.stat(facts)
+            fingerprint = "{}:{}:{}".format(
+                os.path.abspath(facts), status.st_size, status.st_mtime_ns
+            )
+            if (
+                self.prover_ is None
+                or fingerprint != self.facts_fingerprint_
+            ):
+                self.prover_ = Prover(FactStore.from_file(facts))
+                self.facts_fingerprint_ = fingerprint
+        elif not isinstance(facts, (list, tuple)):
+            # one-shot iterators can only be read once, compile directly
+            self.prover_ = Prover(FactStore(facts))
+            self.facts_fingerprint_ = None
+        else:
+            fingerprint = get_fingerprint(facts)
+            if (
+                self.prover_ is None
+                or fingerprint != self.facts_fingerprint_
+            ):
+                self.prover_ = Prover(facts)
+                self.facts_fingerprint_ = fingerprint
+        self.prover_.max_bindings = self.max_bindings
+        self.prover_.max_rows = self.max_rows
+        self.prover_.exact = self.exact
+        self.prover_.profiler = self._profiler
+        return self.prover_
+
+    def _get_head_mappings(self, samples):
+        with self._stage("parse"):
+            parsed = parse_literals(samples)
+        # check predicate is not target
+        if any(predicate != self.target for predicate in parsed.predicates):
+            raise ValueError("Sample predicate is not target")
+        offsets = parsed.offsets.tolist()
+        head_mappings = [
+            {
                 chr(65 + index): [argument]
-                for index, argument in enumerate(arguments)
+                for index, argument in enumerate(parsed.arguments[start:stop])
             }
-            y.append(weight)
-            sample_features = []
-            for clause in self.clauses_:
-                features = prover.prove(head_mapping, clause)
-                sample_features.extend(features)
-            X.append(sample_features)
+            for start, stop in zip(offsets[:-1], offsets[1:])
+        ]
+        return head_mappings, parsed.weights.tolist()
+
+    def _prove(self, facts, samples):
+        prover = self._get_prover(facts)
+        head_mappings, y = self._get_head_mappings(samples)
+        cache = self._get_feature_cache()
+        if cache is None:
+            X = self._prove_head_mappings(prover, head_mappings)
+        else:
+            X = self._prove_cached(cache, prover, head_mappings)
         return X, y
 
+    def _get_feature_cache(self):
+        if self.feature_cache is None or self.feature_cache is False:
+            return None
+        if isinstance(self.feature_cache, FeatureCache):
+            return self.feature_cache
+        path = None if self.feature_cache is True else self.feature_cache
+        if self.feature_cache_ is None or self.feature_cache_.path != path:
+            self.feature_cache_ = FeatureCache(path)
+        return self.feature_cache_
+
+    def _prove_cached(self, cache, prover, head_mappings):
+        """Prove only the clauses missing from the feature cache
+        """
+        samples_fingerprint = get_fingerprint(
+            ",".join(
+                value for values in head_mapping.values() for value in values
+            )
+            for head_mapping in head_mappings
+        )
+        keys = [
+            (
+                prover.facts.fingerprint,
+                samples_fingerprint,
+                "{}:{}:{}".format(
+                    prover.max_bindings, prover.max_rows, prover.exact
+                ),
+                ", ".join(str(literal) for literal in clause),
+            )
+            for clause in self.clauses_
+        ]
+        blocks = [cache.get(key) for key in keys]
+        missing = [
+            index for index, block in enumerate(blocks) if block is None
+        ]
+        if missing:
+            X = self._prove_head_mappings(
+                prover,
+                head_mappings,
+                [self.clauses_[index] for index in missing],
+            )
+            if scipy.sparse.issparse(X):
+                X = X.toarray()
+            start = 0
+            for index in missing:
+                stop = start + len(self.clauses_[index])
+                blocks[index] = X[:, start:stop]
+                cache.put(keys[index], blocks[index])
+                start = stop
+        X = np.hstack([np.zeros((len(head_mappings), 0))] + blocks)
+        if self.sparse:
+            return scipy.sparse.csr_matrix(X)
+        return X
+
+    def _iter_prove(self, prover, head_mappings, y, shuffle=False):
+        """Yield dense feature and target blocks of ``chunk_size`` samples
+        """
+        order = np.arange(len(head_mappings))
+        if shuffle:
+            np.random.shuffle(order)
+        y = np.array(y)
+        for start in range(0, len(order), self.chunk_size):
+            chunk = order[start:start + self.chunk_size]
+            X_chunk = self._prove_head_mappings(
+                prover, [head_mappings[index] for index in chunk]
+            )
+            if scipy.sparse.issparse(X_chunk):
+                X_chunk = X_chunk.toarray()
+            yield X_chunk, self._get_y(y[chunk])
+
+    def _get_dataset(self, prover, head_mappings, y):
+        """Training pipeline proving one chunk ahead of the model
+        """
+        n_features = ClauseTrie(self.clauses_).n_columns
+        y_shape = (None,) if self.is_regression else (None, 2)
+
+        def generator():
+            return self._iter_prove(prover, head_mappings, y, shuffle=True)
+
+        dataset = tf.data.Dataset.from_generator(
+            generator,
+            output_signature=(
+                tf.TensorSpec(shape=(None, n_features), dtype=tf.float64),
+                tf.TensorSpec(shape=y_shape, dtype=tf.float64),
+            ),
+        )
+        return dataset.prefetch(1).unbatch().batch(self.batch_size)
+
+    def _get_n_jobs(self):
+        if self.n_jobs < 0:
+            return max(os.cpu_count() + 1 + self.n_jobs, 1)
+        return max(self.n_jobs, 1)
+
+    def _prove_head_mappings(self, prover, head_mappings, clauses=None):
+        trie = ClauseTrie(self.clauses_ if clauses is None else clauses)
+        n_jobs = min(self._get_n_jobs(), len(head_mappings))
+        if n_jobs <= 1:
+            return prover.prove_trie(head_mappings, trie, sparse=self.sparse)
+        bounds = np.linspace(0, len(head_mappings), n_jobs * 4 + 1)
+        shards = [
+            head_mappings[start:stop]
+            for start, stop in zip(
+                bounds[:-1].astype(int), bounds[1:].astype(int)
+            )
+            if stop > start
+        ]
+        if "fork" in multiprocessing.get_all_start_methods():
+            # workers inherit the compiled facts without pickling them
+            _set_worker_state(prover, trie, self.sparse)
+            pool = multiprocessing.get_context("fork").Pool(n_jobs)
+        else:
+            pool = multiprocessing.Pool(
+                n_jobs,
+                initializer=_set_worker_state,
+                initargs=(prover, trie, self.sparse),
+            )
+        try:
+            with pool:
+                blocks = pool.map(_prove_shard, shards)
+        finally:
+            _set_worker_state(None, None)
+        if self.sparse:
+            return scipy.sparse.vstack(blocks, format="csr")
+        return np.vstack(blocks)
+
     def _get_X(self, X):
+        if scipy.sparse.issparse(X):
+            return X.tocsr()
         X = np.array(X)
         return X
 
@@ -150,10 +727,10 @@ class DeepRelNN:
             )
         return y
 
-    def _get_estimator(self, X_train):
+    def _get_estimator(self, n_features):
         # define the estimator
         model = Sequential()
-        model.add(Dropout(0.5, input_shape=(X_train.shape[1],)))
+        model.add(Dropout(0.5, input_shape=(n_features,)))
         model.add(Dense(50, activation='relu'))
         model.add(Dropout(0.5))
         model.add(Dense(50, activation='relu'))
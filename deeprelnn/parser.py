@@ -1,4 +1,26 @@
+import gzip
 import re
+import string
+from collections import namedtuple
+
+import numpy as np
+
+# one literal per line, same grammar as get_literal
+_LITERAL_LINE = re.compile(
+    r"^(?:([0-9.]+)[ \t\r\f\v]*::[ \t\r\f\v]*)?"
+    r"([a-zA-Z0-9_]*)\(([a-zA-Z0-9,_ \t\r\f\v]*)\)\.[^\n]*$",
+    re.MULTILINE,
+)
+_SPACES = " \t\r\f\v"
+_WEIGHT_BYTES = (string.digits + ".").encode("ascii")
+_LITERAL_BYTES = (
+    string.ascii_letters + string.digits + "_.:(),\n" + _SPACES
+).encode("ascii")
+
+ParsedLiterals = namedtuple(
+    "ParsedLiterals",
+    ["predicates", "predicate_ids", "arguments", "offsets", "weights"],
+)
 
 
 def get_literal(literal_string):
@@ -18,6 +40,163 @@ def get_literal(literal_string):
     return float(weight), predicate, arguments
 
 
+def _scan_literals(lines):
+    """Split a block of plain literals with bulk string operations
+
+    Only handles the common layout (no trailing text after the final
+    dot and no spaces outside the arguments) and returns None for
+    anything else, which is then left to the regular expression.
+    """
+    n_lines = len(lines)
+    buffer = "\n".join(lines) + "\n"
+    try:
+        raw = buffer.encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    if raw.translate(None, _LITERAL_BYTES):
+        return None
+    if not (
+        buffer.count("(") == buffer.count(")") == n_lines
+        and buffer.count(").\n") == n_lines
+    ):
+        return None
+    # the counts above may still pair the "(" of one line with the
+    # ")." of another, e.g. "a(b(c)." followed by "d)."
+    data = np.frombuffer(raw, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord("\n"))
+    opens = np.flatnonzero(data == ord("("))
+    if (opens > newlines).any() or (opens[1:] < newlines[:-1]).any():
+        return None
+    pieces = buffer[:-3].replace(").\n", "(").split("(")
+    if len(pieces) != 2 * n_lines:
+        return None
+    heads, arguments = pieces[0::2], pieces[1::2]
+    weights = np.ones(n_lines)
+    if "::" in buffer:
+        # locate the lines holding a "weight::" prefix and cut it off;
+        # splitting the joined heads instead measured slower, creating
+        # the strings costs more than the loop
+        weighted = np.searchsorted(
+            newlines,
+            np.flatnonzero((data[:-1] == ord(":")) & (data[1:] == ord(":"))),
+        ).tolist()
+        weight_strings = []
+        for index in weighted:
+            weight, _, heads[index] = heads[index].partition("::")
+            weight_strings.append(weight)
+        if "".join(weight_strings).encode("ascii").translate(
+            None, _WEIGHT_BYTES
+        ):
+            return None
+        try:
+            weights[weighted] = np.array(weight_strings, dtype=np.float64)
+        except ValueError:
+            return None
+    joined_heads = "(".join(heads)
+    joined_arguments = "\n".join(arguments)
+    if (
+        any(character in joined_heads for character in "\n,.:" + _SPACES)
+        or any(character in joined_arguments for character in ".:")
+    ):
+        return None
+    for space in _SPACES:
+        if space in joined_arguments:
+            joined_arguments = joined_arguments.replace(space, "")
+    return heads, joined_arguments, weights
+
+
+def _match_literals(lines, numbers):
+    """Split a block of literals with the line grammar, reporting the
+    line numbers of malformed literals
+    """
+    matches = _LITERAL_LINE.findall("\n".join(lines))
+    if len(matches) != len(lines):
+        matches = []
+        malformed = []
+        for number, line in zip(numbers, lines):
+            match = _LITERAL_LINE.match(line)
+            if match is None:
+                malformed.append(number)
+            else:
+                matches.append(match.groups(""))
+        if malformed:
+            raise ValueError(
+                "Malformed literals at lines {}".format(
+                    ", ".join(str(number) for number in malformed)
+                )
+            )
+    weights = []
+    malformed = []
+    for number, (weight, _, _) in zip(numbers, matches):
+        try:
+            weights.append(float(weight) if weight else 1.0)
+        except ValueError:
+            malformed.append(number)
+    if malformed:
+        raise ValueError(
+            "Malformed weights at lines {}".format(
+                ", ".join(str(number) for number in malformed)
+            )
+        )
+    joined_arguments = "\n".join(match[2] for match in matches)
+    for space in _SPACES:
+        joined_arguments = joined_arguments.replace(space, "")
+    return [match[1] for match in matches], joined_arguments, weights
+
+
+def parse_literals(lines, start=1, line_numbers=None):
+    """Parse a block of literals, one per line, in bulk
+
+    Well-formed blocks are split with a handful of passes over the
+    joined text instead of several regex calls per line; blocks the
+    scanner cannot handle fall back to a single precompiled pattern.
+
+    Args:
+        lines (list): literal strings, e.g. ``"0.5::pred(a, b)."``.
+        start (int, optional): line number of the first line, used in
+            error messages. Defaults to 1.
+        line_numbers (list, optional): line number of every line, for
+            blocks whose lines are not consecutive. Overrides ``start``.
+            Defaults to None.
+
+    Returns:
+        ParsedLiterals with the distinct predicate names, the index of
+        every line's predicate in that list, the flat list of arguments
+        with the offsets delimiting each line's arguments, and the
+        array of weights.
+
+    Raises:
+        ValueError: listing the line numbers of malformed literals.
+    """
+    lines = list(lines)
+    scanned = _scan_literals(lines)
+    if scanned is None:
+        if line_numbers is None:
+            line_numbers = range(start, start + len(lines))
+        scanned = _match_literals(lines, line_numbers)
+    heads, joined_arguments, weights = scanned
+    predicates = {}
+    predicate_ids = np.array(
+        [predicates.setdefault(head, len(predicates)) for head in heads],
+        dtype=np.int64,
+    )
+    # the arguments of every line end at a newline, count their commas
+    raw = np.frombuffer(joined_arguments.encode("ascii"), dtype=np.uint8)
+    arities = np.bincount(
+        np.searchsorted(
+            np.flatnonzero(raw == ord("\n")), np.flatnonzero(raw == ord(","))
+        ),
+        minlength=len(heads),
+    ) + 1
+    return ParsedLiterals(
+        list(predicates),
+        predicate_ids,
+        joined_arguments.replace("\n", ",").split(",") if heads else [],
+        np.concatenate([[0], np.cumsum(arities)]).astype(np.int64),
+        np.array(weights, dtype=np.float64),
+    )
+
+
 def get_modes(modes):
     parsed_modes = []
     for mode in modes:
@@ -44,9 +223,34 @@ def get_constants(modes, facts):
                 types.setdefault(
                     mode[0], {}
                 ).setdefault(index, argument[1])
+    # compiled fact stores already hold the interned constant columns
+    if hasattr(facts, "get_constants"):
+        return facts.get_constants(types)
     for fact in facts:
         _, predicate, arguments = get_literal(fact)
         if predicate in types:
             for key, value in types.get(predicate).items():
                 constants.setdefault(value, set()).add(arguments[key])
     return constants
+
+
+def read_facts(path, line_numbers=False):
+    """Lazily read the facts of a text file, one per line
+
+    Files ending in ``.gz`` are decompressed on the fly and blank lines
+    are skipped.
+
+    Args:
+        path (str): path of the file.
+        line_numbers (bool, optional): Yield (line number, fact) pairs,
+            counting the skipped lines. Defaults to False.
+    """
+    if path.endswith(".gz"):
+        file = gzip.open(path, "rt", encoding="utf-8")
+    else:
+        file = open(path, encoding="utf-8")
+    with file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if line:
+                yield (number, line) if line_numbers else line
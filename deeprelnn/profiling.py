@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+
+
+class Profiler:
+    """Wall time and counters of the stages of a fit or predict.
+
+    Stages are timed with ``stage`` and may nest, e.g. parsing the
+    samples is part of proving them. A Prover given the profiler also
+    records every literal it evaluates: its time, the fact rows it
+    scanned and the number of (sample, constant) bindings left on its
+    variables. A literal of a prefix shared by several clauses in a
+    ClauseTrie is evaluated once and counted towards each of them.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._literals = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name, seconds):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        stage["seconds"] += seconds
+        stage["calls"] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_literal(self, clause, index, seconds, rows, bindings):
+        """Record an evaluation of literal ``index`` of ``clause``
+        """
+        literals = self._literals.get(tuple(clause))
+        if literals is None:
+            literals = self._literals[tuple(clause)] = [
+                {"calls": 0, "seconds": 0.0, "rows": 0, "bindings": 0}
+                for _ in clause
+            ]
+        literal = literals[index]
+        literal["calls"] += 1
+        literal["seconds"] += seconds
+        literal["rows"] += rows
+        literal["bindings"] += bindings
+
+    def report(self, top_k=None):
+        """Recorded statistics as a JSON-serializable dict
+
+        Args:
+            top_k (int, optional): Number of clauses reported, the most
+                expensive first. Defaults to None, i.e. every clause.
+
+        Returns:
+            Dict with the ``stages`` and their seconds and calls, the
+            ``counters`` and the ``clauses`` sorted by decreasing time,
+            each with the totals and the statistics of its literals.
+        """
+        clauses = []
+        for clause, literals in self._literals.items():
+            clauses.append({
+                "clause": ", ".join(str(literal) for literal in clause),
+                "seconds": sum(literal["seconds"] for literal in literals),
+                "rows": sum(literal["rows"] for literal in literals),
+                "bindings": sum(literal["bindings"] for literal in literals),
+                "literals": [
+                    dict(statistics, literal=str(literal))
+                    for literal, statistics in zip(clause, literals)
+                ],
+            })
+        clauses.sort(key=lambda clause: -clause["seconds"])
+        return {
+            "stages": {
+                name: dict(stage) for name, stage in self.stages.items()
+            },
+            "counters": dict(self.counters),
+            "clauses": clauses if top_k is None else clauses[:top_k],
+        }
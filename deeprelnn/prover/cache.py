@@ -0,0 +1,115 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LiteralCache:
+    """Size-bounded LRU cache of literal lookups.
+
+    Keys identify a predicate and the ids bound to each of its
+    arguments, values are the matching rows and their mean weight.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+class FeatureCache:
+    """Feature columns of proved clauses, kept in memory or on disk.
+
+    Keys are tuples of strings, e.g. the fingerprints of the facts and
+    of the samples and the clause. With a ``path`` every entry is
+    written as a ``.npy`` file named after the digest of its key and is
+    memory-mapped when read back, so entries outlive the process.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _digest(self, key):
+        digest = hashlib.blake2b(digest_size=16)
+        for part in key:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _get_path(self, key):
+        return os.path.join(self.path, self._digest(key) + ".npy")
+
+    def get(self, key):
+        if self.path is None:
+            value = self._entries.get(key)
+        elif os.path.exists(self._get_path(key)):
+            value = np.load(self._get_path(key), mmap_mode="r")
+        else:
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.path is None:
+            self._entries[key] = value
+            return
+        # write then rename so readers never see a partial file
+        path = self._get_path(key)
+        temporary = "{}.{}.tmp.npy".format(path[:-4], os.getpid())
+        np.save(temporary, value)
+        os.replace(temporary, path)
+
+    def clear(self):
+        self._entries.clear()
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.path, name))
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        if self.path is None:
+            size = len(self._entries)
+        else:
+            size = sum(
+                name.endswith(".npy") and ".tmp." not in name
+                for name in os.listdir(self.path)
+            )
+        return {"hits": self.hits, "misses": self.misses, "size": size}
@@ -0,0 +1,327 @@
+import itertools
+
+import numpy as np
+
+from deeprelnn.fol import Constant, Variable
+
+
+def group_ranks(groups):
+    """Rank of every element within its run of equal sorted ``groups``
+    """
+    if not len(groups):
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    return np.arange(len(groups)) - np.repeat(
+        starts, np.diff(np.r_[starts, len(groups)])
+    )
+
+
+def unique_rows(table, return_inverse=False):
+    """``np.unique(table, axis=0)``, sorting one integer per row when
+    the rows fit in one
+    """
+    if len(table) and table.shape[1]:
+        low = table.min(axis=0)
+        bases = (table.max(axis=0) - low + 1).tolist()
+        if np.prod(bases, dtype=object) < 2 ** 63:
+            keys = np.zeros(len(table), dtype=np.int64)
+            for column, base in enumerate(bases):
+                keys = keys * base + (table[:, column] - low[column])
+            _, index, inverse = np.unique(
+                keys, return_index=True, return_inverse=True
+            )
+            if return_inverse:
+                return table[index], inverse
+            return table[index]
+    unique = np.unique(table, axis=0, return_inverse=return_inverse)
+    if return_inverse:
+        return unique[0], unique[1].ravel()
+    return unique
+
+
+def _get_blocks(samples, size):
+    """Ranges of about ``size`` sorted samples, not splitting a sample
+    """
+    start = 0
+    while start < len(samples):
+        stop = min(start + size, len(samples))
+        if stop < len(samples):
+            stop = int(np.searchsorted(samples, samples[stop - 1], "right"))
+        yield start, stop
+        start = stop
+
+
+def match_keys(left, right):
+    """Positions of every pair of equal keys of two arrays
+
+    Returns:
+        Aligned arrays of positions in ``left`` and in ``right``, with
+        the matches of every left key in the order of ``right``.
+    """
+    order = np.argsort(right, kind="stable")
+    starts = np.searchsorted(right[order], left, side="left")
+    counts = np.searchsorted(right[order], left, side="right") - starts
+    lefts = np.repeat(np.arange(len(left)), counts)
+    offsets = np.arange(len(lefts)) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    return lefts, order[np.repeat(starts, counts) + offsets]
+
+
+def get_variables(literals):
+    """Names of the variables of some literals, "_" excluded
+    """
+    return {
+        argument.name
+        for literal in literals
+        for argument in literal.arguments
+        if isinstance(argument, Variable) and argument.name != "_"
+    }
+
+
+def get_head_table(store, head_mappings, columns):
+    """Binding table of the head variables of every sample
+
+    The first column holds the sample and the others the ids bound to
+    ``columns``, one row per combination of the values of a sample.
+    """
+    rows = []
+    for sample, head_mapping in enumerate(head_mappings):
+        values = [
+            store.encode(head_mapping.get(variable, [])).tolist()
+            for variable in columns
+        ]
+        rows.extend(
+            (sample,) + combination
+            for combination in itertools.product(*values)
+        )
+    return np.array(rows, dtype=np.int64).reshape(-1, 1 + len(columns))
+
+
+class JoinStep:
+    """Compiled join of a binding table with the facts of one literal.
+
+    The distinct (sample, bound ids) keys of the table are probed on
+    the index of the bound argument returning the fewest rows per key
+    and the other arguments are checked on the rows it returns. A fact
+    row matches a single key of a sample, so the features are computed
+    from these matches without expanding the table, and keys are probed
+    in blocks of whole samples to bound their memory. The table is then
+    projected on the variables that are still needed: without new ones
+    it only loses the rows of unmatched keys, otherwise the distinct
+    projections of its rows are joined with the distinct new ids of
+    their key.
+
+    Args:
+        predicate (str): name of the relation.
+        probe (tuple): (argument, table column) to probe, or None when
+            no argument is bound by the table.
+        constants (list): (argument, constant id) pairs.
+        bound (list): (argument, table column) pairs checked on rows.
+        repeats (list): (argument, argument) pairs of a variable that
+            appears twice in the literal.
+        new (list): arguments binding new variables.
+        keep (list): table columns kept after the join, the joined
+            table holds the old columns followed by the new variables.
+    """
+    # keys probed at once, bounding the rows matched in memory
+    block_size = 1 << 16
+
+    def __init__(self, predicate, probe, constants, bound, repeats, new, keep):
+        self.predicate = predicate
+        self.probe = probe
+        self.constants = constants
+        self.bound = bound
+        self.repeats = repeats
+        self.new = new
+        self.keep = keep
+
+    @classmethod
+    def compile(cls, store, literal, columns, needed):
+        """Plan the join of ``literal`` with a table of ``columns``
+
+        Args:
+            store (FactStore): facts the plan is run against.
+            literal (Literal): literal to join.
+            columns (list): variables bound by the table.
+            needed (set): variables used after this literal.
+
+        Returns:
+            The step and the variables of the table it returns.
+        """
+        constants, bound, repeats, new = [], [], [], []
+        new_variables = {}
+        for i, argument in enumerate(literal.arguments):
+            if isinstance(argument, Constant):
+                constants.append((i, int(store.encode([argument.name])[0])))
+            elif isinstance(argument, Variable) and argument.name != "_":
+                if argument.name in columns:
+                    bound.append((i, columns.index(argument.name)))
+                elif argument.name in new_variables:
+                    repeats.append((i, new_variables[argument.name]))
+                else:
+                    new_variables[argument.name] = i
+                    new.append(i)
+        probe = None
+        if bound and literal.predicate.name in store:
+            relation = store[literal.predicate.name]
+            # fewest rows per distinct key first
+            probe = min(
+                bound,
+                key=lambda item: len(relation) / max(
+                    len(relation.indexes[item[0]].keys), 1
+                ),
+            )
+            bound.remove(probe)
+        outputs = list(columns) + [
+            literal.arguments[i].name for i in new
+        ]
+        keep = [
+            index for index, name in enumerate(outputs) if name in needed
+        ]
+        step = cls(
+            literal.predicate.name, probe, constants, bound, repeats, new,
+            keep,
+        )
+        return step, [outputs[index] for index in keep]
+
+    def _match(self, relation, keys):
+        """Rows matching every key of a block, as (key, row) pairs
+        """
+        matches, rows = relation.indexes[self.probe[0]].probe(keys[:, 1])
+        n_scanned = len(rows)
+        checked = np.ones(len(rows), dtype=bool)
+        for position, constant_id in self.constants:
+            checked &= relation.columns[position][rows] == constant_id
+        for index, (position, _) in enumerate(self.bound, 2):
+            checked &= relation.columns[position][rows] == keys[matches, index]
+        for position, other in self.repeats:
+            checked &= (
+                relation.columns[position][rows]
+                == relation.columns[other][rows]
+            )
+        return matches[checked], rows[checked], n_scanned
+
+    def _select(self, relation):
+        """Rows matching the constants, for a literal without bound
+        arguments
+        """
+        rows = relation.select({
+            position: np.array([constant_id])
+            for position, constant_id in self.constants
+        })
+        n_scanned = len(rows)
+        for position, other in self.repeats:
+            rows = rows[
+                relation.columns[position][rows]
+                == relation.columns[other][rows]
+            ]
+        return np.sort(rows), n_scanned
+
+    def run(
+        self,
+        store,
+        table,
+        n_samples,
+        max_rows=None,
+        max_bindings=None,
+        stats=None,
+    ):
+        """Join the table with the facts of the literal
+
+        ``stats["rows"]``, when given, receives the number of fact rows
+        scanned before the bound arguments are checked.
+
+        Returns:
+            The feature of every sample, the joined table and the budget
+            hits, as ``Prover`` counts them.
+        """
+        hits = {"bindings": 0, "rows": 0}
+        features = np.zeros(n_samples)
+        keep = [0] + [1 + index for index in self.keep]
+        if self.predicate not in store or not len(table):
+            # the new variables are not columns of the table yet
+            return features, np.zeros((0, len(keep)), table.dtype), hits
+        relation = store[self.predicate]
+        probed = [] if self.probe is None else [self.probe]
+        keys, inverse = unique_rows(
+            table[:, [0] + [1 + column for _, column in probed + self.bound]],
+            return_inverse=True,
+        )
+        width = table.shape[1]
+        new = [self.new[index - width] for index in keep if index >= width]
+        matched = np.zeros(len(keys), dtype=bool)
+        if self.probe is None:
+            # the same rows for every sample
+            rows, n_scanned = self._select(relation)
+            if max_rows is not None and len(rows) > max_rows:
+                hits["rows"] = len(keys)
+                rows = rows[:max_rows]
+            if len(rows):
+                matched[:] = True
+                features[keys[:, 0]] = relation.weights[rows].mean()
+            if new:
+                rights = unique_rows(np.column_stack([
+                    relation.columns[position][rows] for position in new
+                ]))
+        else:
+            counts = np.zeros(n_samples, dtype=np.int64)
+            weights = np.zeros(n_samples)
+            rights = []
+            n_scanned = 0
+            for start, stop in _get_blocks(keys[:, 0], self.block_size):
+                matches, rows, n_block = self._match(
+                    relation, keys[start:stop]
+                )
+                matches += start
+                n_scanned += n_block
+                samples = keys[matches, 0]
+                if max_rows is not None:
+                    # keep the first rows of every sample
+                    order = np.lexsort((rows, samples))
+                    samples, matches = samples[order], matches[order]
+                    rows = rows[order]
+                    kept = group_ranks(samples) < max_rows
+                    if not kept.all():
+                        hits["rows"] += len(np.unique(samples[~kept]))
+                        samples = samples[kept]
+                        matches, rows = matches[kept], rows[kept]
+                counts += np.bincount(samples, minlength=n_samples)
+                weights += np.bincount(
+                    samples, relation.weights[rows], minlength=n_samples
+                )
+                matched[matches] = True
+                if new:
+                    rights.append(unique_rows(np.column_stack([matches] + [
+                        relation.columns[position][rows] for position in new
+                    ])))
+            proved = counts > 0
+            features[proved] = weights[proved] / counts[proved]
+            rights = np.concatenate(
+                rights or [np.zeros((0, 1 + len(new)), dtype=np.int64)]
+            )
+        if stats is not None:
+            stats["rows"] = n_scanned
+        # distinct projections of the rows of matched keys
+        lefts = unique_rows(
+            np.column_stack([
+                inverse, table[:, [index for index in keep if index < width]]
+            ])[matched[inverse]]
+        )
+        if not new:
+            table = lefts[:, 1:]
+        elif self.probe is None:
+            table = np.column_stack([
+                np.repeat(lefts[:, 1:], len(rights), axis=0),
+                np.tile(rights, (len(lefts), 1)),
+            ])
+        else:
+            left, right = match_keys(lefts[:, 0], rights[:, 0])
+            table = np.column_stack([lefts[left, 1:], rights[right, 1:]])
+        table = unique_rows(table)
+        if max_bindings is not None:
+            kept = group_ranks(table[:, 0]) < max_bindings
+            if not kept.all():
+                hits["bindings"] = len(np.unique(table[~kept, 0]))
+                table = table[kept]
+        return features, table, hits
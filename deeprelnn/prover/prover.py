@@ -1,56 +1,643 @@
-import pandas as pd
+import time
+from bisect import bisect_left
+
+import numpy as np
+from scipy.sparse import csr_matrix
 
 from deeprelnn.fol import Constant, Variable
 from deeprelnn.prover.base import BaseProver
+from deeprelnn.prover.cache import LiteralCache
+from deeprelnn.prover.join import (
+    JoinStep,
+    get_head_table,
+    get_variables,
+    group_ranks,
+)
+from deeprelnn.store import FactStore
+
+
+class BatchState:
+    """Variable bindings of a block of samples while proving a clause.
+
+    A binding is either an array of ids shared by every sample or a
+    tuple of aligned ``(samples, ids)`` arrays holding unique pairs.
+    ``hits`` counts the samples whose last literal exceeded a budget
+    and ``rows`` the fact rows it scanned.
+    """
+    def __init__(self, active, bindings):
+        self.active = active
+        self.bindings = bindings
+        self.hits = {"bindings": 0, "rows": 0}
+        self.rows = 0
+
+    def copy(self):
+        return BatchState(self.active.copy(), self.bindings.copy())
 
 
 class Prover(BaseProver):
-    def __init__(self, facts):
+    """Prove clauses against a compiled FactStore
+
+    Args:
+        facts: Fact strings or a compiled FactStore.
+        cache_size (int, optional): Maximum number of literal lookups
+            memoized by (predicate, bound ids). Defaults to 0, i.e. no
+            cache.
+        max_bindings (int, optional): Maximum number of ids bound to a
+            variable for a sample, the smallest ids are kept. Defaults
+            to None, i.e. no limit.
+        max_rows (int, optional): Maximum number of rows matched by a
+            literal for a sample, the first rows are kept. Defaults to
+            None, i.e. no limit.
+        exact (bool, optional): Join the literals over tables of
+            co-bound variables instead of binding every variable
+            independently. Feature ``k`` is then the mean weight of the
+            facts of literal ``k`` in the join of literals ``0..k``.
+            Budgets bound the facts and the table rows of a sample.
+            Defaults to False.
+        profiler (Profiler, optional): Records the time, scanned rows
+            and bindings of every literal evaluated. Defaults to None.
+
+    Proofs truncated by a budget are counted per clause in
+    ``budget_hits``. Facts can be added and removed in place with
+    ``add_facts`` and ``remove_facts``, the literal cache and the
+    compiled joins are dropped once the facts change.
+    """
+    def __init__(
+        self,
+        facts,
+        cache_size=0,
+        max_bindings=None,
+        max_rows=None,
+        exact=False,
+        profiler=None,
+    ):
         super().__init__(facts)
+        self.cache = LiteralCache(cache_size) if cache_size else None
+        self.max_bindings = max_bindings
+        self.max_rows = max_rows
+        self.exact = exact
+        self.profiler = profiler
+        self.budget_hits = {}
+        self._join_steps = {}
+        self._version = self.facts.version
 
     def _compile(self, data):
-        data_dict = {}
-        for item in data:
-            weight, predicate, arguments = self._get_literal(item)
-            data_dict.setdefault(predicate, []).append(arguments + [weight])
-        for key in data_dict.keys():
-            value = data_dict[key]
-            data_dict[key] = pd.DataFrame(
-                value,
-                columns=[
-                    "{}_{}".format(key, i)
-                    for i in range(len(value[0]) - 1)
-                ] + ["weight"],
-            )
-        return data_dict
+        if isinstance(data, FactStore):
+            return data
+        return FactStore(data)
+
+    def add_facts(self, facts):
+        """Add fact strings to the compiled facts, see FactStore
+        """
+        self.facts.add_facts(facts)
+        self._sync()
+
+    def remove_facts(self, facts):
+        """Remove fact strings from the compiled facts, see FactStore
+
+        Returns:
+            The number of facts removed.
+        """
+        count = self.facts.remove_facts(facts)
+        self._sync()
+        return count
+
+    def _sync(self):
+        """Drop what was derived from the facts once they changed
+        """
+        if self._version == self.facts.version:
+            return
+        self._version = self.facts.version
+        if self.cache is not None:
+            self.cache.clear()
+        self._join_steps.clear()
+
+    def cache_info(self):
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+    def _select(self, relation, literal_mapping):
+        """Rows of a relation matching the bound ids and their mean weight
+        """
+        if self.cache is None:
+            rows = relation.select(literal_mapping)
+            return rows, relation.weights[rows].mean() if len(rows) else 0.0
+        key = (relation.name,) + tuple(
+            (position, np.unique(ids).tobytes())
+            for position, ids in sorted(literal_mapping.items())
+        )
+        value = self.cache.get(key)
+        if value is None:
+            rows = relation.select(literal_mapping)
+            rows.flags.writeable = False
+            value = (
+                rows,
+                relation.weights[rows].mean() if len(rows) else 0.0,
+            )
+            self.cache.put(key, value)
+        return value
+
+    def _record_hits(self, clause, hits):
+        if not any(hits.values()):
+            return
+        counters = self.budget_hits.setdefault(
+            ", ".join(str(literal) for literal in clause),
+            {"bindings": 0, "rows": 0},
+        )
+        for kind, count in hits.items():
+            counters[kind] += count
+
+    def _count_bindings(self, bindings, literal, n_active=1):
+        """Number of (sample, id) bindings of the variables of a literal
+        """
+        count = 0
+        for variable in get_variables([literal]):
+            binding = bindings.get(variable)
+            if isinstance(binding, tuple):
+                count += len(binding[0])
+            elif binding is not None:
+                count += len(binding) * n_active
+        return count
+
+    def _profile_node(self, trie, columns, seconds, rows, bindings):
+        for column in columns:
+            clause = trie.column_clauses[column]
+            self.profiler.add_literal(
+                trie.clauses[clause],
+                column - bisect_left(trie.column_clauses, clause),
+                seconds,
+                rows,
+                bindings,
+            )
+
+    def _limit_rows(self, relation, rows, weight):
+        if self.max_rows is None or len(rows) <= self.max_rows:
+            return rows, weight, 0
+        rows = rows[:self.max_rows]
+        return rows, relation.weights[rows].mean(), 1
+
+    def _limit_ids(self, ids):
+        if self.max_bindings is None or len(ids) <= self.max_bindings:
+            return ids, 0
+        return ids[:self.max_bindings], 1
+
+    def _limit_pairs(self, pairs, limit):
+        """Keep the first ``limit`` pairs of every sample
+
+        Returns:
+            The kept pairs and the number of samples that lost pairs.
+        """
+        samples, values = pairs
+        if limit is None:
+            return pairs, 0
+        keep = group_ranks(samples) < limit
+        if keep.all():
+            return pairs, 0
+        return (samples[keep], values[keep]), len(np.unique(samples[~keep]))
 
     def prove(self, head_mapping, clause):
-        last_mapping = head_mapping.copy()
+        self._sync()
+        if self.exact:
+            return self._prove_exact([head_mapping], clause)[0].tolist()
+        last_mapping = {
+            variable: np.unique(self.facts.encode(values))
+            for variable, values in head_mapping.items()
+        }
         proved_literals = [0.0] * len(clause)
+        hits = {"bindings": 0, "rows": 0}
+        try:
+            self._prove_literals(last_mapping, clause, proved_literals, hits)
+        finally:
+            self._record_hits(clause, hits)
+        return proved_literals
+
+    def _prove_literals(self, last_mapping, clause, proved_literals, hits):
         for index, literal in enumerate(clause):
-            literal_mapping = {}
+            if self.profiler is not None:
+                start = time.perf_counter()
+            weight, n_rows = self._prove_literal(last_mapping, literal, hits)
+            if self.profiler is not None:
+                self.profiler.add_literal(
+                    clause,
+                    index,
+                    time.perf_counter() - start,
+                    n_rows,
+                    self._count_bindings(last_mapping, literal),
+                )
+            if weight is None:
+                return
+            proved_literals[index] = float(weight)
+
+    def _prove_literal(self, last_mapping, literal, hits):
+        """Bind the variables of a literal to the ids of its rows
+
+        Returns:
+            The mean weight of the rows, None when there is none, and
+            the number of rows scanned.
+        """
+        literal_mapping = {}
+        for i, argument in enumerate(literal.arguments):
+            if isinstance(argument, Constant):
+                literal_mapping[i] = self.facts.encode([argument.name])
+            if isinstance(argument, Variable):
+                if (
+                    argument.name != "_"
+                    and last_mapping.get(argument.name) is not None
+                ):
+                    literal_mapping[i] = last_mapping.get(argument.name)
+        if literal.predicate.name not in self.facts:
+            return None, 0
+        relation = self.facts[literal.predicate.name]
+        rows, weight = self._select(relation, literal_mapping)
+        n_rows = len(rows)
+        if not n_rows:
+            return None, 0
+        rows, weight, hit = self._limit_rows(relation, rows, weight)
+        hits["rows"] += hit
+        for i, argument in enumerate(literal.arguments):
+            if isinstance(argument, Variable) and argument.name != "_":
+                last_mapping[argument.name], hit = self._limit_ids(
+                    np.unique(relation.columns[i][rows])
+                )
+                hits["bindings"] += hit
+        return weight, n_rows
+
+    def _pair_keys(self, samples, ids):
+        return samples * max(self.facts.n_constants, 1) + ids
+
+    def _unique_pairs(self, samples, ids):
+        radix = max(self.facts.n_constants, 1)
+        keys = np.unique(self._pair_keys(samples, ids))
+        return keys // radix, keys % radix
+
+    def _get_batch_state(self, head_mappings):
+        variables = set()
+        for head_mapping in head_mappings:
+            variables.update(head_mapping)
+        bindings = {}
+        for variable in variables:
+            samples, values = [], []
+            for sample, head_mapping in enumerate(head_mappings):
+                sample_values = head_mapping.get(variable, [])
+                samples.extend([sample] * len(sample_values))
+                values.extend(sample_values)
+            ids = self.facts.encode(values)
+            known = ids >= 0
+            bindings[variable] = self._unique_pairs(
+                np.array(samples, dtype=np.int64)[known], ids[known]
+            )
+        return BatchState(np.ones(len(head_mappings), dtype=bool), bindings)
+
+    def _prove_batch_literal(self, state, literal):
+        n_samples = len(state.active)
+        features = np.zeros(n_samples)
+        state.hits = {"bindings": 0, "rows": 0}
+        state.rows = 0
+        if literal.predicate.name not in self.facts:
+            state.active[:] = False
+            return features
+        relation = self.facts[literal.predicate.name]
+        shared_mapping = {}
+        sample_mapping = []
+        for i, argument in enumerate(literal.arguments):
+            if isinstance(argument, Constant):
+                shared_mapping[i] = self.facts.encode([argument.name])
+            if isinstance(argument, Variable):
+                binding = state.bindings.get(argument.name)
+                if argument.name == "_" or binding is None:
+                    continue
+                if isinstance(binding, tuple):
+                    sample_mapping.append((i, binding))
+                else:
+                    shared_mapping[i] = binding
+        if not sample_mapping:
+            # every active sample sees the same rows
+            rows, weight = self._select(relation, shared_mapping)
+            state.rows = len(rows)
+            if not len(rows):
+                state.active[:] = False
+                return features
+            n_active = int(state.active.sum())
+            rows, weight, hit = self._limit_rows(relation, rows, weight)
+            state.hits["rows"] += hit * n_active
+            features[state.active] = weight
             for i, argument in enumerate(literal.arguments):
-                if type(argument) == Constant:
-                    literal_mapping[i] = [argument.name]
-                if type(argument) == Variable:
-                    if (
-                        argument.name != "_"
-                        and last_mapping.get(argument.name) is not None  # noqa: E501
-                    ):
-                        literal_mapping[i] = last_mapping.get(argument.name)
-            if literal.predicate.name not in self.facts:
-                return proved_literals
-            df = self.facts[literal.predicate.name]
-            for i, mapping in literal_mapping.items():
-                df = df[df[
-                    "{}_{}".format(literal.predicate.name, i)].isin(mapping)
+                if isinstance(argument, Variable) and argument.name != "_":
+                    state.bindings[argument.name], hit = self._limit_ids(
+                        np.unique(relation.columns[i][rows])
+                    )
+                    state.hits["bindings"] += hit * n_active
+            return features
+        sample_mapping.sort(key=lambda item: len(item[1][0]))
+        (i, (samples, ids)), *other_mappings = sample_mapping
+        active = state.active[samples]
+        positions, matched = relation.indexes[i].probe(ids[active])
+        samples = samples[active][positions]
+        state.rows = len(matched)
+        if shared_mapping:
+            rows, _ = self._select(relation, shared_mapping)
+            keep = np.isin(matched, rows)
+            samples, matched = samples[keep], matched[keep]
+        for i, (other_samples, other_ids) in other_mappings:
+            keep = np.isin(
+                self._pair_keys(samples, relation.columns[i][matched]),
+                self._pair_keys(other_samples, other_ids),
+            )
+            samples, matched = samples[keep], matched[keep]
+        if self.max_rows is not None:
+            # keep the first rows of every sample, as ``prove`` does
+            order = np.lexsort((matched, samples))
+            (samples, matched), hit = self._limit_pairs(
+                (samples[order], matched[order]), self.max_rows
+            )
+            state.hits["rows"] += hit
+        counts = np.bincount(samples, minlength=n_samples)
+        proved = counts > 0
+        state.active &= proved
+        weights = np.bincount(
+            samples, relation.weights[matched], minlength=n_samples
+        )
+        features[proved] = weights[proved] / counts[proved]
+        for i, argument in enumerate(literal.arguments):
+            if isinstance(argument, Variable) and argument.name != "_":
+                state.bindings[argument.name], hit = self._limit_pairs(
+                    self._unique_pairs(samples, relation.columns[i][matched]),
+                    self.max_bindings,
+                )
+                state.hits["bindings"] += hit
+        return features
+
+    def prove_batch(self, head_mappings, clause):
+        """Prove a clause for a block of samples at once
+
+        Args:
+            head_mappings (list): one head mapping per sample, as taken
+                by ``prove``. Every mapping binds the same variables.
+            clause (list): literals of the clause body.
+
+        Returns:
+            Array of shape (n_samples, n_literals) where every row holds
+            the same values ``prove`` returns for that sample.
+        """
+        self._sync()
+        if self.exact:
+            return self._prove_exact(head_mappings, clause)
+        state = self._get_batch_state(head_mappings)
+        proved_literals = np.zeros((len(head_mappings), len(clause)))
+        for index, literal in enumerate(clause):
+            if not state.active.any():
+                break
+            if self.profiler is not None:
+                n_active = int(state.active.sum())
+                start = time.perf_counter()
+            proved_literals[:, index] = self._prove_batch_literal(
+                state, literal
+            )
+            if self.profiler is not None:
+                self.profiler.add_literal(
+                    clause,
+                    index,
+                    time.perf_counter() - start,
+                    state.rows,
+                    self._count_bindings(state.bindings, literal, n_active),
+                )
+            self._record_hits(clause, state.hits)
+        return proved_literals
+
+    def _get_join_step(self, literal, columns, needed):
+        """Compiled join of a literal, memoized by its inputs
+        """
+        key = (str(literal), tuple(columns), frozenset(needed))
+        if key not in self._join_steps:
+            self._join_steps[key] = JoinStep.compile(
+                self.facts, literal, columns, needed
+            )
+        return self._join_steps[key]
+
+    def _get_head_columns(self, head_mappings, literals):
+        variables = set()
+        for head_mapping in head_mappings:
+            variables.update(head_mapping)
+        return sorted(variables & get_variables(literals))
+
+    def _run_join_step(self, step, table, n_samples, stats=None):
+        return step.run(
+            self.facts,
+            table,
+            n_samples,
+            self.max_rows,
+            self.max_bindings,
+            stats,
+        )
+
+    def _prove_exact(self, head_mappings, clause):
+        columns = self._get_head_columns(head_mappings, clause)
+        table = get_head_table(self.facts, head_mappings, columns)
+        proved_literals = np.zeros((len(head_mappings), len(clause)))
+        for index, literal in enumerate(clause):
+            if not len(table):
+                break
+            step, columns = self._get_join_step(
+                literal, columns, get_variables(clause[index + 1:])
+            )
+            if self.profiler is None:
+                proved_literals[:, index], table, hits = self._run_join_step(
+                    step, table, len(head_mappings)
+                )
+            else:
+                stats = {"rows": 0}
+                start = time.perf_counter()
+                proved_literals[:, index], table, hits = self._run_join_step(
+                    step, table, len(head_mappings), stats
+                )
+                self.profiler.add_literal(
+                    clause,
+                    index,
+                    time.perf_counter() - start,
+                    stats["rows"],
+                    len(table),
+                )
+            self._record_hits(clause, hits)
+        return proved_literals
+
+    def _get_subtree_variables(self, node):
+        variables = set()
+        stack = list(node.children.values())
+        while stack:
+            child = stack.pop()
+            variables |= get_variables([child.literal])
+            stack.extend(child.children.values())
+        return variables
+
+    def _get_needed_groups(self, trie, node, columns):
+        """Clauses through a node grouped by the variables they use below
+
+        Without ``max_bindings`` every clause can share a table of all
+        the variables used below the node. A budget keeps the first rows
+        of the table of a sample, so it has to see the same columns as
+        when the clause is proved alone.
+
+        Returns:
+            Dict of the needed variables -> set of clause indexes, or
+            None for every clause of ``columns``.
+        """
+        if self.max_bindings is None:
+            return {frozenset(self._get_subtree_variables(node)): None}
+        groups = {}
+        for column in columns:
+            clause = trie.column_clauses[column]
+            position = column - bisect_left(trie.column_clauses, clause)
+            needed = get_variables(trie.clauses[clause][position + 1:])
+            groups.setdefault(frozenset(needed), set()).add(clause)
+        return groups
+
+    def _prove_exact_trie_node(
+        self, table, columns, n_samples, node, write, trie, clauses=None
+    ):
+        for child in node.children.values():
+            child_columns = [
+                column for column in child.columns
+                if clauses is None or trie.column_clauses[column] in clauses
+            ]
+            groups = self._get_needed_groups(trie, child, child_columns)
+            for index, (needed, group) in enumerate(groups.items()):
+                group_columns = [
+                    column for column in child_columns
+                    if group is None or trie.column_clauses[column] in group
                 ]
-            if not len(df):
-                return proved_literals
-            for i, argument in enumerate(literal.arguments):
-                if type(argument) == Variable and argument.name != "_":
-                    last_mapping[argument.name] = df[
-                        "{}_{}".format(literal.predicate.name, i)
-                    ].values.tolist()
-            proved_literals[index] = df["weight"].mean()
+                step, step_columns = self._get_join_step(
+                    child.literal, columns, needed
+                )
+                if self.profiler is None:
+                    features, child_table, hits = self._run_join_step(
+                        step, table, n_samples
+                    )
+                else:
+                    stats = {"rows": 0}
+                    start = time.perf_counter()
+                    features, child_table, hits = self._run_join_step(
+                        step, table, n_samples, stats
+                    )
+                    self._profile_node(
+                        trie,
+                        group_columns,
+                        time.perf_counter() - start,
+                        stats["rows"],
+                        len(child_table),
+                    )
+                if not index:
+                    # the features do not depend on the variables kept
+                    write(child_columns, features)
+                for column in group_columns:
+                    self._record_hits(
+                        trie.clauses[trie.column_clauses[column]], hits
+                    )
+                if child.children and len(child_table):
+                    self._prove_exact_trie_node(
+                        child_table,
+                        step_columns,
+                        n_samples,
+                        child,
+                        write,
+                        trie,
+                        group if group is not None else clauses,
+                    )
+
+    def _prove_trie_node(self, state, node, write, trie):
+        children = list(node.children.values())
+        for index, child in enumerate(children):
+            # the last child can take over the parent's bindings
+            child_state = state if index == len(children) - 1 \
+                else state.copy()
+            if self.profiler is not None:
+                n_active = int(child_state.active.sum())
+                start = time.perf_counter()
+            features = self._prove_batch_literal(child_state, child.literal)
+            if self.profiler is not None:
+                self._profile_node(
+                    trie,
+                    child.columns,
+                    time.perf_counter() - start,
+                    child_state.rows,
+                    self._count_bindings(
+                        child_state.bindings, child.literal, n_active
+                    ),
+                )
+            write(child.columns, features)
+            for column in child.columns:
+                self._record_hits(
+                    trie.clauses[trie.column_clauses[column]],
+                    child_state.hits,
+                )
+            if child.children and child_state.active.any():
+                self._prove_trie_node(child_state, child, write, trie)
+
+    def prove_trie(self, head_mappings, trie, sparse=False, out=None):
+        """Prove every clause of a ClauseTrie for a block of samples
+
+        Shared clause prefixes are proved once and their bindings reused
+        by every clause below them.
+
+        Args:
+            head_mappings (list): one head mapping per sample.
+            trie (ClauseTrie): clauses to prove.
+            sparse (bool, optional): Return a CSR matrix holding only
+                the proved literals. Defaults to False.
+            out (ndarray, optional): Dense array of the result shape to
+                write into instead of allocating one. Defaults to None.
+
+        Returns:
+            Matrix of shape (n_samples, trie.n_columns) equal to stacking
+            the ``prove_batch`` result of every clause.
+        """
+        self._sync()
+        shape = (len(head_mappings), trie.n_columns)
+        if sparse:
+            rows, columns, values = [], [], []
+
+            def write(node_columns, features):
+                proved = np.flatnonzero(features)
+                for column in node_columns:
+                    rows.append(proved)
+                    columns.append(np.full(len(proved), column))
+                    values.append(features[proved])
+        else:
+            if out is None:
+                proved_literals = np.zeros(shape)
+            else:
+                proved_literals = out
+                proved_literals[:] = 0.0
+
+            def write(node_columns, features):
+                proved_literals[:, node_columns] = features[:, None]
+
+        if len(head_mappings) and self.exact:
+            head_columns = self._get_head_columns(
+                head_mappings, [node.literal for node in trie.iter_nodes()]
+            )
+            self._prove_exact_trie_node(
+                get_head_table(self.facts, head_mappings, head_columns),
+                head_columns,
+                len(head_mappings),
+                trie.root,
+                write,
+                trie,
+            )
+        elif len(head_mappings):
+            self._prove_trie_node(
+                self._get_batch_state(head_mappings), trie.root, write, trie
+            )
+        if sparse:
+            empty = [np.zeros(0, dtype=np.int64)]
+            return csr_matrix(
+                (
+                    np.concatenate([np.zeros(0)] + values),
+                    (
+                        np.concatenate(empty + rows),
+                        np.concatenate(empty + columns),
+                    ),
+                ),
+                shape=shape,
+            )
         return proved_literals
@@ -0,0 +1,56 @@
+class TrieNode:
+    def __init__(self, literal=None):
+        self.literal = literal
+        self.columns = []
+        self.children = {}
+
+
+class ClauseTrie:
+    """Prefix tree over the literals of a set of clauses.
+
+    Clauses starting with the same literals share the nodes of that
+    prefix, so the bindings computed for it are reused by every clause
+    below. Literal ``j`` of clause ``i`` keeps the feature column it
+    has when the clauses are proved one after the other, i.e. the sum
+    of the lengths of the previous clauses plus ``j``.
+    """
+    def __init__(self, clauses):
+        self.root = TrieNode()
+        self.n_columns = 0
+        self.clauses = []
+        # index in ``clauses`` of the clause owning every column
+        self.column_clauses = []
+        for clause in clauses:
+            self.add(clause)
+
+    def add(self, clause):
+        node = self.root
+        for literal in clause:
+            key = str(literal)
+            if key not in node.children:
+                node.children[key] = TrieNode(literal)
+            node = node.children[key]
+            node.columns.append(self.n_columns)
+            self.column_clauses.append(len(self.clauses))
+            self.n_columns += 1
+        self.clauses.append(clause)
+
+    def iter_nodes(self):
+        """Every node below the root, parents before their children
+        """
+        stack = list(self.root.children.values())
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children.values())
+
+    def __len__(self):
+        """Number of distinct literals, i.e. nodes below the root
+        """
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            count += len(node.children)
+            stack.extend(node.children.values())
+        return count
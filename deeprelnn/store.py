@@ -0,0 +1,762 @@
+import hashlib
+import itertools
+import json
+import os
+
+import numpy as np
+
+from deeprelnn.parser import parse_literals, read_facts
+
+
+def _ranges(starts, stops):
+    """Concatenate ``arange(start, stop)`` for every pair of bounds
+    """
+    lengths = stops - starts
+    total = lengths.sum()
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(total, dtype=np.int64)
+
+
+class ArgumentIndex:
+    """Maps every key of a column to the offsets of the rows holding it.
+
+    Keys are interned constant ids, so the index keeps the distinct keys
+    sorted next to the row offsets grouped by key and probes them with a
+    binary search instead of materializing one Python object per key.
+
+    Rows appended after the index was built are not merged in: their
+    keys, starting at offset ``tail_start``, are kept in a separate
+    sorted tail until the index is rebuilt. Rows listed in the sorted
+    ``removed`` offsets are never returned.
+    """
+    fields = ("rows", "keys", "offsets")
+
+    def __init__(self, rows, keys, offsets):
+        self.rows = rows
+        self.keys = keys
+        self.offsets = offsets
+        self.tail_start = len(rows)
+        self.removed = np.zeros(0, dtype=np.int64)
+        self.set_tail(np.zeros(0, dtype=np.int64))
+
+    @classmethod
+    def from_keys(cls, keys):
+        rows = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[rows], return_index=True)
+        return cls(
+            rows, unique_keys, np.append(starts, len(keys)).astype(np.int64)
+        )
+
+    def _bounds(self, values):
+        if not len(self.keys):
+            empty = np.zeros(len(values), dtype=np.int64)
+            return empty, empty
+        positions = np.minimum(
+            np.searchsorted(self.keys, values), len(self.keys) - 1
+        )
+        starts = self.offsets[positions]
+        stops = np.where(
+            self.keys[positions] == values,
+            self.offsets[positions + 1],
+            starts,
+        )
+        return starts, stops
+
+    def set_tail(self, keys):
+        """Keys of the rows appended from offset ``tail_start`` on
+        """
+        self.tail_keys = keys
+        self._tail_rows = self.tail_start + np.argsort(keys, kind="stable")
+        self._sorted_tail_keys = keys[self._tail_rows - self.tail_start]
+
+    def _tail_bounds(self, values):
+        return (
+            np.searchsorted(self._sorted_tail_keys, values, side="left"),
+            np.searchsorted(self._sorted_tail_keys, values, side="right"),
+        )
+
+    def lookup(self, values):
+        """Sorted offsets of the rows whose key is one of ``values``
+        """
+        values = np.unique(values)
+        rows = self.rows[_ranges(*self._bounds(values))]
+        if len(self.tail_keys):
+            rows = np.concatenate([
+                rows, self._tail_rows[_ranges(*self._tail_bounds(values))]
+            ])
+        rows.sort()
+        if len(self.removed):
+            rows = rows[~np.isin(rows, self.removed, assume_unique=True)]
+        return rows
+
+    def probe(self, values):
+        """Join ``values`` against the indexed column
+
+        Returns:
+            Aligned arrays with the position in ``values`` and the
+            offset of every matching row.
+        """
+        starts, stops = self._bounds(values)
+        positions = np.repeat(np.arange(len(values)), stops - starts)
+        rows = self.rows[_ranges(starts, stops)]
+        if len(self.tail_keys):
+            starts, stops = self._tail_bounds(values)
+            positions = np.concatenate([
+                positions,
+                np.repeat(np.arange(len(values)), stops - starts),
+            ])
+            rows = np.concatenate([
+                rows, self._tail_rows[_ranges(starts, stops)]
+            ])
+            # keep the matches of every value together
+            grouped = np.argsort(positions, kind="stable")
+            positions, rows = positions[grouped], rows[grouped]
+        if len(self.removed):
+            kept = ~np.isin(rows, self.removed)
+            positions, rows = positions[kept], rows[kept]
+        return positions, rows
+
+
+class Relation:
+    """Facts of a single predicate stored column-wise.
+
+    Each argument position is a contiguous array of constant ids and
+    the weight of every fact is kept in a parallel float array. Every
+    argument position is indexed and, when the key space fits in 64
+    bits, the whole tuple of arguments is indexed as well to answer
+    fully bound lookups with a single probe.
+
+    Facts appended later are written to spare capacity at the end of
+    the arrays and scanned by the indexes until the relation is
+    compacted, removed facts stay in the arrays as tombstones until
+    then. ``len`` counts the stored rows, tombstones included.
+    """
+    max_composite_keys = 4096
+    # compact once the pending rows exceed this share of the indexed
+    # rows, or this number of rows for small relations
+    compaction_ratio = 0.1
+    min_compaction_rows = 1024
+
+    def __init__(self, name, columns, weights, radix, indexes, composite):
+        self.name = name
+        self.columns = columns
+        self.weights = weights
+        self.radix = radix
+        self.indexes = indexes
+        self.composite = composite
+        self.removed = np.zeros(0, dtype=np.int64)
+        self._n_indexed = len(weights)
+        self._buffers = None
+        self._statistics = {}
+
+    @classmethod
+    def from_columns(cls, name, columns, weights, radix):
+        relation = cls(
+            name,
+            columns,
+            weights,
+            max(radix, 1),
+            [ArgumentIndex.from_keys(column) for column in columns],
+            None,
+        )
+        if relation.arity > 1 and relation.radix ** relation.arity < 2 ** 63:
+            relation.composite = ArgumentIndex.from_keys(
+                relation._combine(columns)
+            )
+        return relation
+
+    @property
+    def arity(self):
+        return len(self.columns)
+
+    def __len__(self):
+        return len(self.weights)
+
+    def _combine(self, columns):
+        keys = np.zeros(len(columns[0]), dtype=np.int64)
+        for column in columns:
+            keys = keys * self.radix + column
+        return keys
+
+    @property
+    def n_pending(self):
+        """Number of appended or removed rows not compacted yet
+        """
+        return len(self) - self._n_indexed + len(self.removed)
+
+    def get_rows(self):
+        """Offsets of the rows that were not removed
+        """
+        rows = np.arange(len(self), dtype=np.int64)
+        if len(self.removed):
+            rows = np.setdiff1d(rows, self.removed, assume_unique=True)
+        return rows
+
+    def get_column(self, position):
+        """Ids of an argument in the rows that were not removed
+        """
+        if len(self.removed):
+            return self.columns[position][self.get_rows()]
+        return self.columns[position]
+
+    def get_statistics(self, top_k=10):
+        """Row count and, per argument, distinct and most frequent ids
+
+        Returns:
+            dict with the number of ``rows`` and, for every argument,
+            its number of ``distinct`` ids and the ``top`` ``top_k``
+            (id, count) pairs, most frequent first.
+        """
+        if top_k not in self._statistics:
+            arguments = []
+            for position, index in enumerate(self.indexes):
+                if self.n_pending:
+                    keys, counts = np.unique(
+                        self.get_column(position), return_counts=True
+                    )
+                else:
+                    keys, counts = index.keys, np.diff(index.offsets)
+                top = np.argsort(-counts, kind="stable")[:top_k]
+                arguments.append({
+                    "distinct": len(keys),
+                    "top": list(zip(
+                        keys[top].tolist(), counts[top].tolist()
+                    )),
+                })
+            self._statistics[top_k] = {
+                "rows": len(self) - len(self.removed),
+                "arguments": arguments,
+            }
+        return self._statistics[top_k]
+
+    def _reserve(self, n_rows):
+        """Make room to append ``n_rows`` rows without copying
+        """
+        size = len(self)
+        if self._buffers is not None and \
+                len(self._buffers[0]) >= size + n_rows:
+            return
+        capacity = max(2 * size, size + n_rows, 16)
+        self._buffers = []
+        for array in self.columns + [self.weights]:
+            buffer = np.empty(capacity, dtype=array.dtype)
+            buffer[:size] = array
+            self._buffers.append(buffer)
+
+    def append(self, columns, weights):
+        """Append facts, given as id columns and weights
+        """
+        start = len(self)
+        stop = start + len(weights)
+        self._reserve(len(weights))
+        for buffer, array in zip(self._buffers, columns + [weights]):
+            buffer[start:stop] = array
+        self.columns = [buffer[:stop] for buffer in self._buffers[:-1]]
+        self.weights = self._buffers[-1][:stop]
+        for index, column in zip(self.indexes, self.columns):
+            index.set_tail(column[self._n_indexed:])
+        if self.composite is not None:
+            if max(int(column.max(initial=0)) for column in columns) \
+                    >= self.radix:
+                # new ids do not fit the composite keys until compacted
+                self.composite = None
+            else:
+                self.composite.set_tail(np.concatenate([
+                    self.composite.tail_keys, self._combine(columns)
+                ]))
+        self._statistics = {}
+
+    def remove(self, columns):
+        """Remove every fact with the given id tuples
+
+        Returns:
+            The number of rows removed.
+        """
+        if not len(columns[0]):
+            return 0
+        positions, rows = self.indexes[0].probe(columns[0])
+        matched = np.ones(len(rows), dtype=bool)
+        for position in range(1, self.arity):
+            matched &= (
+                self.columns[position][rows] == columns[position][positions]
+            )
+        rows = np.unique(rows[matched])
+        if len(rows):
+            self.removed = np.union1d(self.removed, rows)
+            for index in self.indexes + [self.composite]:
+                if index is not None:
+                    index.removed = self.removed
+            self._statistics = {}
+        return len(rows)
+
+    def needs_compaction(self):
+        return self.n_pending > max(
+            self.min_compaction_rows, self.compaction_ratio * self._n_indexed
+        )
+
+    def compact(self, radix):
+        """Rebuild the arrays and indexes without pending rows
+
+        Row offsets change, anything holding them has to be dropped.
+        """
+        rows = self.get_rows()
+        relation = Relation.from_columns(
+            self.name,
+            [np.ascontiguousarray(column[rows]) for column in self.columns],
+            self.weights[rows],
+            radix,
+        )
+        self.columns = relation.columns
+        self.weights = relation.weights
+        self.radix = relation.radix
+        self.indexes = relation.indexes
+        self.composite = relation.composite
+        self.removed = relation.removed
+        self._n_indexed = len(self.weights)
+        self._buffers = None
+        self._statistics = {}
+
+    def estimate_rows(self, bindings):
+        """Rows expected to match, assuming independent arguments
+
+        Provers do not use it to reorder the literals of a clause: the
+        features of the literals after the first one without rows are
+        zero, so every literal up to that one is proved in any order
+        and proving a later, more selective one first only adds work.
+
+        Args:
+            bindings (dict): argument index -> bound constant id, or
+                None for an argument bound to unknown ids.
+        """
+        statistics = self.get_statistics()
+        rows = float(statistics["rows"])
+        if not rows:
+            return 0.0
+        estimate = rows
+        for position, constant_id in bindings.items():
+            argument = statistics["arguments"][position]
+            top = dict(argument["top"])
+            others = argument["distinct"] - len(top)
+            if constant_id is None:
+                matches = rows / max(argument["distinct"], 1)
+            elif constant_id in top:
+                matches = top[constant_id]
+            elif constant_id < 0 or not others:
+                matches = 0
+            else:
+                # average count of the ids outside the most frequent
+                matches = (rows - sum(top.values())) / others
+            estimate *= matches / rows
+        return estimate
+
+    def select(self, bindings):
+        """Offsets of the rows matching the bound arguments
+
+        Args:
+            bindings (dict): argument index -> array of admissible ids.
+        """
+        bindings = {
+            position: ids[ids >= 0]
+            for position, ids in bindings.items()
+        }
+        if not bindings:
+            return self.get_rows()
+        if (
+            self.composite is not None
+            and len(bindings) == self.arity
+            and np.prod(
+                [len(ids) for ids in bindings.values()], dtype=np.float64
+            ) <= self.max_composite_keys
+        ):
+            keys = np.zeros(1, dtype=np.int64)
+            for position in range(self.arity):
+                # ids interned after the relation are not in its columns
+                ids = bindings[position]
+                keys = np.add.outer(
+                    keys * self.radix, ids[ids < self.radix]
+                ).ravel()
+            return self.composite.lookup(keys)
+        rows = None
+        for position, ids in sorted(
+            bindings.items(), key=lambda item: len(item[1])
+        ):
+            matched = self.indexes[position].lookup(ids)
+            if rows is None:
+                rows = matched
+            else:
+                rows = np.intersect1d(rows, matched, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+
+class FactStore:
+    """Compiled fact base with constants interned to integer ids
+    """
+    def __init__(self, facts=(), chunk_size=100000):
+        self._constants = []
+        self._constant_ids = {}
+        self._constants_path = None
+        self._n_constants = 0
+        self._fingerprint = None
+        self.relations = {}
+        # incremented on every update, for the caches built on the store
+        self.version = 0
+        self._compile(facts, chunk_size)
+
+    @classmethod
+    def from_file(cls, path, chunk_size=100000):
+        """Compile the facts of a text file, optionally gzip compressed
+        """
+        store = cls()
+        store._compile(read_facts(path, line_numbers=True), chunk_size, True)
+        return store
+
+    @property
+    def constants(self):
+        if self._constants is None:
+            with open(self._constants_path, encoding="utf-8") as file:
+                self._constants = file.read().split("\n")[:self._n_constants]
+        return self._constants
+
+    @property
+    def constant_ids(self):
+        if self._constant_ids is None:
+            self._constant_ids = dict(
+                zip(self.constants, range(len(self.constants)))
+            )
+        return self._constant_ids
+
+    @property
+    def n_constants(self):
+        if self._constants is None:
+            return self._n_constants
+        return len(self._constants)
+
+    @property
+    def fingerprint(self):
+        """Digest of the constants and the facts of every relation
+        """
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update("\n".join(self.constants).encode("utf-8"))
+            for name in sorted(self.relations):
+                relation = self.relations[name]
+                digest.update(
+                    "\0{}/{}\0".format(name, relation.arity).encode("utf-8")
+                )
+                rows = relation.get_rows() if len(relation.removed) \
+                    else slice(None)
+                for array in relation.columns + [relation.weights]:
+                    digest.update(
+                        np.ascontiguousarray(array[rows]).tobytes()
+                    )
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _intern(self, constants):
+        constant_ids = self.constant_ids
+        n_constants = len(constant_ids)
+        ids = np.array(
+            [
+                constant_ids.setdefault(constant, len(constant_ids))
+                for constant in constants
+            ],
+            dtype=np.int64,
+        )
+        # new constants were inserted last, in id order
+        new_constants = list(itertools.islice(
+            reversed(constant_ids), len(constant_ids) - n_constants
+        ))
+        new_constants.reverse()
+        self.constants.extend(new_constants)
+        return ids
+
+    def _compile(self, facts, chunk_size, numbered=False):
+        # facts are consumed in chunks so that only one chunk is ever
+        # held as Python objects, everything else lives in int arrays;
+        # numbered facts are (line number, fact) pairs
+        facts = iter(facts)
+        parts = {}
+        line_number = 1
+        while True:
+            chunk = list(itertools.islice(facts, chunk_size))
+            if not chunk:
+                break
+            if numbered:
+                line_numbers, chunk = zip(*chunk)
+                parsed = parse_literals(chunk, line_numbers=line_numbers)
+            else:
+                parsed = parse_literals(chunk, start=line_number)
+                line_number += len(chunk)
+            ids = self._intern(parsed.arguments)
+            for predicate, table, weights in self._split(parsed, ids):
+                tables, weight_arrays = parts.setdefault(predicate, ([], []))
+                if tables and tables[0].shape[1] != table.shape[1]:
+                    raise ValueError(
+                        "Inconsistent arity for predicate {}".format(
+                            predicate
+                        )
+                    )
+                tables.append(table)
+                weight_arrays.append(weights)
+        for predicate, (tables, weight_arrays) in parts.items():
+            table = np.concatenate(tables)
+            self.relations[predicate] = Relation.from_columns(
+                predicate,
+                [
+                    np.ascontiguousarray(table[:, i])
+                    for i in range(table.shape[1])
+                ],
+                np.concatenate(weight_arrays),
+                self.n_constants,
+            )
+
+    def _split(self, parsed, ids):
+        """Argument ids and weights of the facts of every predicate
+        """
+        arities = np.diff(parsed.offsets)
+        for predicate_id, predicate in enumerate(parsed.predicates):
+            lines = np.flatnonzero(parsed.predicate_ids == predicate_id)
+            arity = arities[lines[0]]
+            if np.any(arities[lines] != arity) or (
+                predicate in self.relations
+                and self.relations[predicate].arity != arity
+            ):
+                raise ValueError(
+                    "Inconsistent arity for predicate {}".format(predicate)
+                )
+            yield (
+                predicate,
+                ids[parsed.offsets[lines][:, None] + np.arange(arity)],
+                parsed.weights[lines],
+            )
+
+    def _updated(self, relations):
+        for relation in relations:
+            if relation.needs_compaction():
+                relation.compact(self.n_constants)
+        self._fingerprint = None
+        self.version += 1
+
+    def add_facts(self, facts):
+        """Add facts in place, interning their new constants
+
+        Facts of known predicates are appended to their relations and
+        only indexed when the relation is compacted, see ``compact``.
+        """
+        parsed = parse_literals(list(facts))
+        ids = self._intern(parsed.arguments)
+        relations = []
+        for predicate, table, weights in self._split(parsed, ids):
+            columns = [
+                np.ascontiguousarray(table[:, i])
+                for i in range(table.shape[1])
+            ]
+            if predicate in self.relations:
+                self.relations[predicate].append(columns, weights)
+            else:
+                self.relations[predicate] = Relation.from_columns(
+                    predicate, columns, weights, self.n_constants
+                )
+            relations.append(self.relations[predicate])
+        self._updated(relations)
+
+    def remove_facts(self, facts):
+        """Remove every fact with the arguments of the given facts
+
+        Weights are ignored and constants keep their ids.
+
+        Returns:
+            The number of facts removed.
+        """
+        parsed = parse_literals(list(facts))
+        ids = self.encode(parsed.arguments)
+        relations = []
+        count = 0
+        for predicate, table, _ in self._split(parsed, ids):
+            if predicate not in self.relations:
+                continue
+            table = table[(table >= 0).all(axis=1)]
+            relation = self.relations[predicate]
+            count += relation.remove(
+                [table[:, i] for i in range(table.shape[1])]
+            )
+            relations.append(relation)
+        self._updated(relations)
+        return count
+
+    def compact(self):
+        """Index the appended facts and drop the removed ones
+        """
+        relations = []
+        for relation in self.relations.values():
+            if relation.n_pending:
+                relation.compact(self.n_constants)
+                relations.append(relation)
+        if relations:
+            self.version += 1
+
+    def __contains__(self, predicate):
+        return predicate in self.relations
+
+    def __getitem__(self, predicate):
+        return self.relations[predicate]
+
+    def encode(self, constants):
+        """Map constant names to ids, unknown constants are mapped to -1
+        """
+        return np.array(
+            [self.constant_ids.get(constant, -1) for constant in constants],
+            dtype=np.int64,
+        )
+
+    def decode(self, ids):
+        return [self.constants[constant_id] for constant_id in ids]
+
+    def get_constants(self, types):
+        """Collect the constants appearing at typed argument positions
+
+        Args:
+            types (dict): predicate -> {argument index: type}.
+        """
+        constants = {}
+        for predicate, positions in types.items():
+            if predicate not in self.relations:
+                continue
+            relation = self.relations[predicate]
+            for index, argument_type in positions.items():
+                constants.setdefault(argument_type, set()).update(
+                    self.decode(np.unique(relation.get_column(index)))
+                )
+        return constants
+
+    def get_statistics(self, top_k=10):
+        """Statistics of every relation, see ``Relation.get_statistics``
+
+        The most frequent ids are decoded to constant names.
+        """
+        statistics = {}
+        for name, relation in self.relations.items():
+            relation_statistics = relation.get_statistics(top_k)
+            statistics[name] = {
+                "rows": relation_statistics["rows"],
+                "arguments": [
+                    {
+                        "distinct": argument["distinct"],
+                        "top": [
+                            (self.constants[constant_id], count)
+                            for constant_id, count in argument["top"]
+                        ],
+                    }
+                    for argument in relation_statistics["arguments"]
+                ],
+            }
+        return statistics
+
+    def save(self, path):
+        """Write the compiled store to the directory ``path``
+
+        Every array is written as a ``.npy`` file so that ``load`` can map
+        it into memory instead of reading it.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(
+            os.path.join(path, "constants.txt"), "w", encoding="utf-8"
+        ) as file:
+            file.write("\n".join(self.constants))
+        metadata = {"n_constants": self.n_constants, "relations": {}}
+        for name, relation in self.relations.items():
+            if relation.n_pending:
+                # written compacted, the store itself is left as it is
+                rows = relation.get_rows()
+                relation = Relation.from_columns(
+                    name,
+                    [column[rows] for column in relation.columns],
+                    relation.weights[rows],
+                    self.n_constants,
+                )
+            directory = os.path.join(path, "relations", name)
+            os.makedirs(directory, exist_ok=True)
+            arrays = {"weights": relation.weights}
+            for i, column in enumerate(relation.columns):
+                arrays["column_{}".format(i)] = column
+            indexes = {
+                "index_{}".format(i): index
+                for i, index in enumerate(relation.indexes)
+            }
+            if relation.composite is not None:
+                indexes["composite"] = relation.composite
+            for prefix, index in indexes.items():
+                for field in ArgumentIndex.fields:
+                    arrays["{}_{}".format(prefix, field)] = getattr(
+                        index, field
+                    )
+            for key, array in arrays.items():
+                np.save(os.path.join(directory, key + ".npy"), array)
+            metadata["relations"][name] = {
+                "arity": relation.arity,
+                "radix": relation.radix,
+                "composite": relation.composite is not None,
+            }
+        with open(os.path.join(path, "store.json"), "w") as file:
+            json.dump(metadata, file)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """Open a store written by ``save``
+
+        Arrays are memory-mapped (unless ``mmap_mode`` is None) and the
+        constant dictionary is only read when a constant is first
+        encoded or decoded, so opening a store is independent of its
+        size and processes loading the same store share its pages.
+        """
+        with open(os.path.join(path, "store.json")) as file:
+            metadata = json.load(file)
+        store = cls()
+        store._constants = None
+        store._constant_ids = None
+        store._constants_path = os.path.join(path, "constants.txt")
+        store._n_constants = metadata["n_constants"]
+        for name, info in metadata["relations"].items():
+            directory = os.path.join(path, "relations", name)
+
+            def read(key):
+                return np.load(
+                    os.path.join(directory, key + ".npy"),
+                    mmap_mode=mmap_mode,
+                )
+
+            def read_index(prefix):
+                return ArgumentIndex(*[
+                    read("{}_{}".format(prefix, field))
+                    for field in ArgumentIndex.fields
+                ])
+
+            store.relations[name] = Relation(
+                name,
+                [
+                    read("column_{}".format(i))
+                    for i in range(info["arity"])
+                ],
+                read("weights"),
+                info["radix"],
+                [
+                    read_index("index_{}".format(i))
+                    for i in range(info["arity"])
+                ],
+                read_index("composite") if info["composite"] else None,
+            )
+        return store
+
+
+def get_fingerprint(facts):
+    """Digest identifying a collection of fact strings
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for fact in facts:
+        digest.update(fact.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
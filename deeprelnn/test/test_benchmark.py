@@ -0,0 +1,64 @@
+import pytest
+
+from deeprelnn.benchmark import (
+    format_results,
+    generate_knowledge_base,
+    run_benchmarks,
+)
+from deeprelnn.parser import get_modes, parse_literals
+from deeprelnn.store import FactStore
+
+
+def test_generate_knowledge_base():
+    knowledge_base = generate_knowledge_base(
+        n_predicates=4, n_constants=50, n_facts=400, n_samples=20, seed=3
+    )
+    assert knowledge_base == generate_knowledge_base(
+        n_predicates=4, n_constants=50, n_facts=400, n_samples=20, seed=3
+    )
+    assert knowledge_base.target == "target"
+    assert len(knowledge_base.samples) == 20
+    assert len(parse_literals(knowledge_base.facts).predicate_ids) == len(
+        knowledge_base.facts
+    )
+    store = FactStore(knowledge_base.facts)
+    assert sum(map(len, store.relations.values())) == len(
+        knowledge_base.facts
+    )
+    modes = get_modes(knowledge_base.background)
+    assert len(modes) == len(knowledge_base.background)
+    parsed = parse_literals(knowledge_base.samples)
+    assert set(parsed.predicates) == {"target"}
+    assert 0 < parsed.weights.sum() < len(knowledge_base.samples)
+
+
+def test_generate_weighted_knowledge_base():
+    knowledge_base = generate_knowledge_base(
+        n_predicates=2, n_facts=200, weighted=0.5, skew=0.0, seed=0
+    )
+    weights = parse_literals(knowledge_base.facts).weights
+    assert (weights < 1).any() and (weights == 1).any()
+    # positives are drawn from the weighted facts too
+    knowledge_base = generate_knowledge_base(
+        n_predicates=2, n_facts=200, n_samples=40, weighted=1.0, seed=0
+    )
+    samples = parse_literals(knowledge_base.samples)
+    assert samples.weights.sum() == 20
+    assert len(set(knowledge_base.samples)) == 40
+
+
+def test_run_benchmarks():
+    knowledge_base = generate_knowledge_base(
+        n_predicates=3, n_constants=30, n_facts=200, n_samples=10, seed=1
+    )
+    scenarios = ["parse", "compile", "clauses", "prove", "prove_exact"]
+    results = run_benchmarks(knowledge_base, scenarios, n_clauses=10)
+    assert [result["scenario"] for result in results] == scenarios
+    for result in results:
+        assert result["seconds"] > 0
+        assert result["throughput"] > 0
+        assert result["peak_memory"] > 0
+    assert results[3]["items"] == 10 * 10
+    assert "prove_exact" in format_results(results)
+    with pytest.raises(ValueError):
+        run_benchmarks(knowledge_base, ["unknown"])
@@ -1,7 +1,13 @@
+import numpy as np
 import pytest
 
-from deeprelnn.factory import ClauseFactory, VariableFactory
-from deeprelnn.fol import Variable
+from deeprelnn.factory import (
+    ClauseFactory,
+    VariableFactory,
+    get_canonical_clause,
+)
+from deeprelnn.fol import Constant, Literal, Predicate, Variable
+from deeprelnn.prover.prover import Prover
 
 
 def test_variable_factory_initia_variables():
@@ -130,6 +136,17 @@ def test_clause_factory_get_first_literal():
     ]
 
 
+def test_clause_factory_constants_not_interned():
+    modes = ["advisedby(+person,`person).", "gender(+person,#gender)."]
+    facts = ["gender(person1,unused_gender{}).".format(i) for i in range(5)]
+    factory = ClauseFactory(modes, facts, "advisedby")
+    assert "unused_gender0" not in Constant._instances
+    literal = factory._get_literal(
+        np.array([factory._predicates.index(Predicate("gender")), 0, -2])
+    )
+    assert literal.arguments[1] is Constant("unused_gender0")
+
+
 def test_clause_factory_get_clause():
     modes = [
         "actor(+person).",
@@ -192,3 +209,123 @@ def test_clause_factory_imdb_example():
     assert len(factory.get_clause()) == 4
     factory = ClauseFactory(modes, facts, "workedunder", max_literals=3)
     assert len(factory.get_clause()) == 3
+
+
+def test_clause_factory_get_clauses():
+    modes = [
+        "actor(+person).",
+        "personlovesgender(+person,#gender).",
+        "moviegender(+movie,+gender).",
+        "advisedby(+person,`person).",
+        "moviegender(-movie,#gender).",
+        "actor(-person).",
+    ]
+
+    facts = [
+        "moviegender(movie1,gender1).",
+        "moviegender(movie1,gender2).",
+    ]
+
+    factory = ClauseFactory(modes, facts, "advisedby")
+    clauses = factory.get_clauses(200, seed=0)
+    assert len(clauses) == 200
+    assert len({str([str(literal) for literal in clause]) for clause in clauses}) == 200
+    assert all(len(clause) == 4 for clause in clauses)
+    for clause in clauses:
+        literals = [str(literal) for literal in clause]
+        assert len(set(literals)) == 4
+        # same possibilities as get_clause for the first literal
+        assert literals[0] in [
+            'personlovesgender(A, "gender1")',
+            'personlovesgender(A, "gender2")',
+            'personlovesgender(B, "gender1")',
+            'personlovesgender(B, "gender2")',
+            'advisedby(B, C)',
+            'advisedby(A, C)',
+            'actor(A)',
+            'actor(B)',
+            'actor(C)',
+            'moviegender(C, "gender1")',
+            'moviegender(C, "gender2")',
+        ]
+    assert [str(literal) for literal in clauses[0]] == [
+        str(literal) for literal in factory.get_clauses(200, seed=0)[0]
+    ]
+
+    factory = ClauseFactory(modes, facts, "advisedby", max_literals=1)
+    # only eleven distinct clauses of one literal exist
+    assert len(factory.get_clauses(50)) == 11
+    assert len(factory.get_clauses(50, unique=False)) == 50
+
+
+def test_clause_factory_get_clauses_disallow_recursion():
+    modes = [
+        "advisedby(+person,`person)",
+    ]
+    facts = []
+    factory = ClauseFactory(modes, facts, "advisedby", allow_recursion=False)
+    # error empty list
+    with pytest.raises(IndexError):
+        factory.get_clauses(2)
+
+
+def test_get_canonical_clause():
+    clause = [
+        Literal(Predicate("movie"), [Variable("X"), Variable("A")]),
+        Literal(Predicate("movie"), [Variable("X"), Variable("_")]),
+        Literal(Predicate("genre"), [Variable("Y"), Constant("drama")]),
+        Literal(Predicate("workedunder"), [Variable("B"), Variable("Y")]),
+    ]
+    canonical = get_canonical_clause(clause, [Variable("A"), Variable("B")])
+    assert [str(literal) for literal in canonical] == [
+        "movie(C, A)",
+        "movie(C, _)",
+        'genre(D, "drama")',
+        "workedunder(B, D)",
+    ]
+    # literal order is kept
+    canonical = get_canonical_clause(clause[::-1], [Variable("A")])
+    assert [str(literal) for literal in canonical] == [
+        "workedunder(B, C)",
+        'genre(C, "drama")',
+        "movie(D, _)",
+        "movie(D, A)",
+    ]
+    assert get_canonical_clause([]) == []
+
+
+def test_clause_factory_get_seeded_clauses():
+    modes = [
+        "workedunder(+person,-person).",
+        "workedunder(-person,+person).",
+        "actor(+person).",
+        "director(+person).",
+        "movie(+movie,+person).",
+        "movie(+movie,-person).",
+        "movie(-movie,+person).",
+        "genre(+person,#genre).",
+    ]
+    facts = [
+        "actor(ana).",
+        "actor(bob).",
+        "director(carl).",
+        "movie(m1,ana).",
+        "movie(m1,carl).",
+        "movie(m2,bob).",
+        "movie(m2,dave).",
+        "genre(carl,drama).",
+        "genre(dave,comedy).",
+    ]
+    head_mapping = {"A": ["ana"], "B": ["carl"]}
+    factory = ClauseFactory(modes, facts, "workedunder", allow_recursion=False)
+    prover = Prover(facts)
+    clauses = factory.get_seeded_clauses([head_mapping], 20, seed=0)
+    assert 0 < len(clauses) <= 20
+    assert len({str([str(literal) for literal in clause]) for clause in clauses}) == len(clauses)
+    for clause in clauses:
+        assert 0 < len(clause) <= 4
+        # every literal holds for the seed example
+        assert all(prover.prove(head_mapping, clause))
+        for literal in clause:
+            if literal.predicate.name == "genre":
+                assert str(literal.arguments[1]) in ['"drama"', '"comedy"']
@@ -1,3 +1,6 @@
+import gc
+import pickle
+
 from deeprelnn.fol import Atom, Constant, Literal, Predicate, Term, Variable
 
 
@@ -55,3 +58,34 @@ def test_create_literal():
     assert str(literal) == "relation(A, B)"
     assert repr(literal) == "Literal(Predicate(relation)(Variable(A), Variable(B)))"
     assert literal.weight == 1.0
+
+
+def test_interned_terms():
+    assert Variable("A") is Variable("A")
+    assert Constant('"const"') is Constant("const")
+    assert Predicate("relation") is Predicate("relation")
+    assert Variable("A") != Constant("A")
+    assert Variable("A") != Term("A")
+    assert len({Variable("A"), Variable("A"), Variable("B")}) == 2
+    assert not hasattr(Variable("A"), "__dict__")
+
+
+def test_interned_terms_freed():
+    constant = Constant("unused_constant")
+    predicate = Predicate("unused_relation")
+    assert Constant._instances["unused_constant"] is constant
+    del constant, predicate
+    gc.collect()
+    assert "unused_constant" not in Constant._instances
+    assert "unused_relation" not in Predicate._instances
+
+
+def test_pickle_terms():
+    literal = Literal(Predicate("relation"), [Variable("A"), Constant("b")])
+    loaded = pickle.loads(pickle.dumps(literal))
+    assert loaded.predicate is literal.predicate
+    assert loaded.arguments[0] is Variable("A")
+    assert loaded.arguments[1] is Constant("b")
+    assert loaded == literal
+    assert hash(loaded) == hash(literal)
+    assert loaded != Literal(Predicate("relation"), [Variable("A")])
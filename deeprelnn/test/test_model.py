@@ -1,4 +1,12 @@
+import json
+
+import numpy as np
+import pytest
+
+from deeprelnn.fol import Literal, Predicate, Variable
 from deeprelnn.model import DeepRelNN
+from deeprelnn.prover.prover import Prover
+from deeprelnn.store import FactStore
 
 
 def test_deeprelnn_model():
@@ -90,3 +98,468 @@ def test_deeprelnn_model():
     )
 
     model.fit(facts, samples)
+
+
+def test_deeprelnn_parallel_prove():
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+        "0.0::father(harrypotter,arthurweasley).",
+        "0.0::father(hedwig,harrypotter).",
+    ]
+    clauses = [
+        [
+            Literal(Predicate("childof"), [Variable("B"), Variable("A")]),
+            Literal(Predicate("male"), [Variable("B")]),
+        ],
+        [
+            Literal(Predicate("childof"), [Variable("C"), Variable("A")]),
+            Literal(Predicate("male"), [Variable("C")]),
+        ],
+    ]
+    model = DeepRelNN(background=[], target="father")
+    model.clauses_ = clauses
+    X, y = model._prove(facts, samples)
+    model.n_jobs = 2
+    X_parallel, y_parallel = model._prove(facts, samples)
+    model.sparse = True
+    X_sparse, _ = model._prove(facts, samples)
+    assert X_sparse.toarray().tolist() == X.tolist()
+    assert X_parallel.shape == (5, 4)
+    assert X_parallel.tolist() == X.tolist()
+    assert y_parallel == y == [1.0, 1.0, 0.0, 0.0, 0.0]
+    assert X[:, 0].tolist() == [1.0, 1.0, 1.0, 0.0, 0.0]
+    assert X[:, 1].tolist() == [1.0, 1.0, 0.0, 0.0, 0.0]
+
+
+def test_deeprelnn_reuses_prover():
+    facts = ["male(harrypotter).", "childof(jamespotter,harrypotter)."]
+    model = DeepRelNN(background=[], target="father")
+    prover = model._get_prover(facts)
+    assert model._get_prover(list(facts)) is prover
+    assert model._get_prover(facts + ["male(ronweasley)."]) is not prover
+
+    store = FactStore(facts)
+    prover = model._get_prover(store)
+    assert prover.facts is store
+    assert model._get_prover(store) is prover
+
+    prover = Prover(facts)
+    assert model._get_prover(prover) is prover
+
+
+def test_deeprelnn_keeps_prover_from_fit_to_predict():
+    facts = [
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "0.0::father(ronweasley,jamespotter).",
+    ]
+    model = DeepRelNN(
+        background=["male(+name).", "childof(+name,+name).",
+                    "father(+name,+name)."],
+        target="father",
+        number_of_clauses=3,
+        epochs=1,
+    )
+    model.fit(facts, samples)
+    prover = model.prover_
+    model.predict_proba(list(facts), samples)
+    assert model.prover_ is prover
+    model.predict_proba(facts + ["male(ronweasley)."], samples)
+    assert model.prover_ is not prover
+
+
+def test_deeprelnn_prover_from_stream(tmp_path):
+    facts = ["male(harrypotter).", "childof(jamespotter,harrypotter)."]
+    path = tmp_path / "facts.pl"
+    path.write_text("\n".join(facts))
+    model = DeepRelNN(background=[], target="father")
+    prover = model._get_prover(str(path))
+    assert len(prover.facts["childof"]) == 1
+    assert model._get_prover(str(path)) is prover
+
+    prover = model._get_prover(fact for fact in facts)
+    assert prover.facts.constants == ["harrypotter", "jamespotter"]
+
+
+def test_deeprelnn_sparse_model():
+    background = [
+        "male(+name).",
+        "childof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+        "0.0::father(harrypotter,arthurweasley).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=10,
+        allow_recursion=False,
+        epochs=2,
+        batch_size=3,
+        sparse=True,
+    )
+    model.fit(facts, samples)
+    X, _ = model._prove(facts, samples)
+    assert X.format == "csr"
+    assert model.predict_proba(facts, samples).shape == (4,)
+
+
+def test_deeprelnn_chunked_model():
+    background = [
+        "male(+name).",
+        "childof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+        "0.0::father(harrypotter,arthurweasley).",
+        "0.0::father(hedwig,arthurweasley).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=10,
+        allow_recursion=False,
+        epochs=2,
+        batch_size=3,
+        chunk_size=2,
+    )
+    model.fit(facts, samples)
+    X, y = model._prove(facts, samples)
+    prover = model._get_prover(facts)
+    head_mappings, _ = model._get_head_mappings(samples)
+    chunks = list(model._iter_prove(prover, head_mappings, y))
+    assert [len(X_chunk) for X_chunk, _ in chunks] == [2, 2, 1]
+    assert np.vstack([X_chunk for X_chunk, _ in chunks]).tolist() == X.tolist()
+    assert np.vstack([y_chunk for _, y_chunk in chunks]).tolist() == [
+        [0.0, 1.0], [0.0, 1.0], [1.0, 0.0], [1.0, 0.0], [1.0, 0.0]
+    ]
+    assert model.predict_proba(facts, samples).shape == (5,)
+
+
+def test_deeprelnn_feature_cache(tmpdir):
+    background = [
+        "male(+name).",
+        "childof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=5,
+        allow_recursion=False,
+        epochs=1,
+        feature_cache=True,
+    )
+    model.fit(facts, samples)
+    clauses = model.clauses_
+    expected, _ = model._prove(facts, samples)
+    cache = model.feature_cache_
+    assert cache.info()["misses"] == len(clauses)
+    assert cache.info()["hits"] == len(clauses)
+
+    # refitting on fixed clauses proves nothing again
+    model.clauses = clauses
+    model.fit(facts, samples)
+    assert model.feature_cache_ is cache
+    assert cache.info()["misses"] == len(clauses)
+    assert cache.info()["hits"] == 2 * len(clauses)
+
+    # only new clauses are proved
+    model.clauses_ = clauses + [[Literal(
+        Predicate("childof"), [Variable("B"), Variable("A")]
+    )]]
+    X, _ = model._prove(facts, samples)
+    assert cache.info()["misses"] == len(clauses) + 1
+    assert X[:, :-1].tolist() == expected.tolist()
+    assert X[:, -1].tolist() == [1.0, 1.0, 1.0]
+
+    # entries on disk outlive the model
+    path = str(tmpdir.join("features"))
+    for _ in range(2):
+        model = DeepRelNN(
+            background=background,
+            target="father",
+            clauses=clauses,
+            feature_cache=path,
+            epochs=1,
+        )
+        model.clauses_ = clauses
+        X, _ = model._prove(facts, samples)
+        assert X.tolist() == expected.tolist()
+    assert model.feature_cache_.info() == {
+        "hits": len(clauses), "misses": 0, "size": len(clauses)
+    }
+
+
+def test_deeprelnn_unique_clauses():
+    def clause(variable):
+        return [
+            Literal(Predicate("childof"), [Variable(variable), Variable("A")]),
+            Literal(Predicate("male"), [Variable(variable)]),
+        ]
+
+    model = DeepRelNN(
+        background=["male(+name).", "childof(+name,+name).", "father(+name,+name)."],
+        target="father",
+        clauses=[clause("C"), clause("X"), clause("B"), clause("Var1")],
+        epochs=1,
+    )
+    model.fit(["male(harrypotter).", "childof(harrypotter,jamespotter)."], [
+        "father(jamespotter,harrypotter).",
+        "0.0::father(harrypotter,jamespotter).",
+    ])
+    assert [[str(literal) for literal in clause] for clause in model.clauses_] == [
+        ["childof(C, A)", "male(C)"],
+        ["childof(B, A)", "male(B)"],
+    ]
+
+
+def test_deeprelnn_seeded_clauses():
+    background = [
+        "male(+name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+        "0.0::father(harrypotter,arthurweasley).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=10,
+        allow_recursion=False,
+        clause_generation="seeded",
+        epochs=1,
+    )
+    model.fit(facts, iter(samples))
+    X, _ = model._prove(facts, samples)
+    # every clause covers one of the positive examples
+    assert X.shape[1] > 0
+    assert all(X[:2, column].any() for column in range(X.shape[1]))
+    assert model.predict_proba(facts, samples).shape == (4,)
+
+    model.clause_generation = "bottom"
+    with pytest.raises(ValueError):
+        model.fit(facts, samples)
+
+
+def test_deeprelnn_screening():
+    def literal(predicate, *variables):
+        return Literal(
+            Predicate(predicate), [Variable(variable) for variable in variables]
+        )
+
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(ronweasley).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,jamespotter).",
+        "0.0::father(harrypotter,arthurweasley).",
+    ]
+    model = DeepRelNN(
+        background=["male(+name).", "childof(+name,+name).", "father(+name,+name)."],
+        target="father",
+        clauses=[
+            [literal("childof", "B", "A")],
+            [literal("male", "A"), literal("male", "B")],
+            [literal("female", "A")],
+            [literal("childof", "A", "B")],
+        ],
+        screening_size=4,
+        epochs=1,
+    )
+    model.fit(facts, samples)
+    assert model.screening_ == {
+        "n_samples": 4,
+        "n_clauses": 4,
+        "zero_coverage": 2,
+        "constant": 1,
+        "kept": 1,
+    }
+    assert [str(clause[0]) for clause in model.clauses_] == ["childof(B, A)"]
+    assert model.predict_proba(facts, samples).shape == (4,)
+
+    model.screening_size = 2
+    model.fit(facts, samples)
+    assert model.screening_["n_samples"] == 2
+
+
+def test_deeprelnn_stratified_sample():
+    model = DeepRelNN(background=[], target="father", screening_size=2)
+    y = np.array([1.0, 0.0, 0.0, 0.0])
+    sample = model._get_stratified_sample(y)
+    assert len(sample) == 2
+    assert sorted(y[sample]) == [0.0, 1.0]
+
+    model.screening_size = 10
+    y = np.array([1.0] + [0.0] * 99)
+    sample = model._get_stratified_sample(y)
+    assert len(sample) == 10
+    assert y[sample].sum() == 1.0
+    assert len(set(sample)) == 10
+
+    model.screening_size = 1
+    assert len(model._get_stratified_sample(y)) == 1
+
+
+def test_deeprelnn_score_one():
+    background = [
+        "male(+name).",
+        "childof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,mollyweasley).",
+        "0.0::father(hedwig,arthurweasley).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=10,
+        allow_recursion=False,
+        epochs=2,
+    )
+    model.fit(facts, samples)
+    expected = model.predict_proba(facts, samples)
+    scores = [model.score_one(sample) for sample in samples]
+    assert scores == pytest.approx(expected.tolist(), abs=1e-5)
+    # buffers are allocated once
+    scorer = model._scorer
+    assert model.score_one(samples[0], facts) == pytest.approx(scores[0])
+    assert model._scorer is scorer
+    model.fit(facts, samples)
+    assert model._scorer is None
+
+
+def test_deeprelnn_profile():
+    background = [
+        "male(+name).",
+        "childof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(harrypotter).",
+        "male(jamespotter).",
+        "male(arthurweasley).",
+        "childof(jamespotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+    ]
+    samples = [
+        "father(harrypotter,jamespotter).",
+        "father(ronweasley,arthurweasley).",
+        "0.0::father(ronweasley,jamespotter).",
+    ]
+    model = DeepRelNN(
+        background=background,
+        target="father",
+        number_of_clauses=5,
+        allow_recursion=False,
+        epochs=1,
+        profile=True,
+    )
+    model.fit(facts, samples)
+    report = model.profile_
+    assert set(report["stages"]) == {
+        "total", "compile", "clauses", "prove", "parse", "train"
+    }
+    assert report["counters"] == {
+        "samples": 3, "clauses": len(model.clauses_)
+    }
+    assert 0 < len(report["clauses"]) <= len(model.clauses_)
+    for clause in report["clauses"]:
+        assert clause["literals"][0]["calls"] == 1
+    json.dumps(report)
+    # the compiled prover is kept and stops recording
+    prover = model.prover_
+    assert prover.profiler is None
+
+    model.predict_proba(facts, samples)
+    assert model.prover_ is prover
+    assert set(model.profile_["stages"]) == {
+        "total", "compile", "prove", "parse", "predict"
+    }
+
+    model.profile = False
+    model.fit(facts, samples)
+    assert model.profile_ is None
+
@@ -1,4 +1,7 @@
-from deeprelnn.parser import get_constants, get_modes
+import pytest
+
+from deeprelnn.parser import get_constants, get_literal, get_modes, parse_literals
+from deeprelnn.store import FactStore
 
 
 def test_get_modes():
@@ -42,3 +45,67 @@ def test_get_constant_types():
     modes = get_modes(modes)
     constants = get_constants(modes, facts)
     assert constants["gender"] == set(["horror", "scifi", "comedy"])
+
+
+def test_get_constant_types_from_fact_store():
+    modes = [
+        "actor(+person).",
+        "personlovesgender(+person,#gender).",
+        "moviegender(+movie,#gender).",
+    ]
+
+    facts = FactStore([
+        "personlovesgender(person1, horror).",
+        "personlovesgender(person2, scifi).",
+        "moviegender(person1, comedy).",
+    ])
+
+    modes = get_modes(modes)
+    constants = get_constants(modes, facts)
+    assert constants["gender"] == set(["horror", "scifi", "comedy"])
+
+
+def test_parse_literals():
+    lines = [
+        "0.5::professor(person407).",
+        "recursion_advisedby(person265,person168).",
+        "0::recursion_advisedby(person265, person168).",
+        "2.5 :: movie(movie1, john).",
+        "professor(person1).",
+    ]
+    parsed = parse_literals(lines)
+    assert parsed.predicates == ["professor", "recursion_advisedby", "movie"]
+    assert parsed.predicate_ids.tolist() == [0, 1, 1, 2, 0]
+    assert parsed.weights.tolist() == [0.5, 1.0, 0.0, 2.5, 1.0]
+    assert parsed.offsets.tolist() == [0, 1, 3, 5, 7, 8]
+    for index, line in enumerate(lines):
+        weight, predicate, arguments = get_literal(line)
+        start, stop = parsed.offsets[index], parsed.offsets[index + 1]
+        assert parsed.arguments[start:stop] == arguments
+        assert parsed.predicates[parsed.predicate_ids[index]] == predicate
+        assert parsed.weights[index] == weight
+
+
+def test_parse_literals_trailing_text():
+    parsed = parse_literals(["actor(john). % comment", "actor(maria)."])
+    assert parsed.arguments == ["john", "maria"]
+    assert parse_literals([]).arguments == []
+
+
+def test_parse_literals_malformed():
+    with pytest.raises(ValueError, match="lines 2, 4"):
+        parse_literals(["actor(john).", "actor(john", "a(b).", "(x"])
+    with pytest.raises(ValueError, match="lines 11"):
+        parse_literals(["actor(john).", "1.2.3::actor(john)."], start=10)
+    with pytest.raises(ValueError, match="lines 7"):
+        parse_literals(["actor(john).", "actor(john"], line_numbers=[3, 7])
+    # the weight comes first and is not empty, as in get_literal
+    for line in [" 3::actor(john).", "::actor(john).", "actor(jo::hn)."]:
+        with pytest.raises(ValueError, match="lines 2"):
+            parse_literals(["actor(john).", line])
+        with pytest.raises((AttributeError, ValueError)):
+            get_literal(line)
+    assert parse_literals(["3 :: actor(john)."]).weights.tolist() == [3.0]
+    # balanced over the block but not within each line
+    with pytest.raises(ValueError, match="lines 1, 2"):
+        parse_literals(["actor(john(maria).", "movie)."])
@@ -0,0 +1,46 @@
+import json
+
+from deeprelnn.fol import Literal, Predicate, Variable
+from deeprelnn.profiling import Profiler
+
+
+def test_profiler():
+    profiler = Profiler()
+    with profiler.stage("prove"):
+        with profiler.stage("parse"):
+            pass
+    with profiler.stage("prove"):
+        pass
+    profiler.count("samples", 3)
+    profiler.count("samples")
+    cheap = [Literal(Predicate("male"), [Variable("A")])]
+    costly = [
+        Literal(Predicate("childof"), [Variable("A"), Variable("C")]),
+        Literal(Predicate("male"), [Variable("C")]),
+    ]
+    profiler.add_literal(cheap, 0, 0.5, 2, 1)
+    profiler.add_literal(costly, 0, 1.0, 10, 4)
+    profiler.add_literal(costly, 1, 0.25, 4, 2)
+    profiler.add_literal(costly, 1, 0.25, 3, 1)
+
+    report = profiler.report()
+    assert report["stages"]["prove"]["calls"] == 2
+    assert report["stages"]["parse"]["calls"] == 1
+    assert report["stages"]["prove"]["seconds"] >= \
+        report["stages"]["parse"]["seconds"]
+    assert report["counters"] == {"samples": 4}
+    assert [clause["clause"] for clause in report["clauses"]] == [
+        "childof(A, C), male(C)", "male(A)"
+    ]
+    assert report["clauses"][0]["seconds"] == 1.5
+    assert report["clauses"][0]["rows"] == 17
+    assert report["clauses"][0]["bindings"] == 7
+    assert report["clauses"][0]["literals"][1] == {
+        "literal": "male(C)",
+        "calls": 2,
+        "seconds": 0.5,
+        "rows": 7,
+        "bindings": 3,
+    }
+    assert len(profiler.report(top_k=1)["clauses"]) == 1
+    assert json.loads(json.dumps(report)) == report
@@ -1,5 +1,16 @@
+import random
+
+import numpy as np
+import pytest
+
+from deeprelnn.factory import ClauseFactory
 from deeprelnn.fol import Constant, Literal, Predicate, Variable
+from deeprelnn.parser import get_literal
+from deeprelnn.profiling import Profiler
+from deeprelnn.prover.join import JoinStep, match_keys, unique_rows
 from deeprelnn.prover.prover import Prover
+from deeprelnn.prover.trie import ClauseTrie
+from deeprelnn.store import FactStore
 
 
 def test_get_literal():
@@ -29,11 +40,12 @@ def test_background_knowledge():
         "test3(test2, test3, test4).",
     ]
     bk = Prover(facts)
-    assert bk.facts["test2"].shape == (1, 3)
-    assert bk.facts["test3"].shape == (3, 4)
-    assert bk.facts["test2"].columns[0] == "test2_0"
-    assert bk.facts["test3"].columns[1] == "test3_1"
-    assert sum(bk.facts["test3"]["weight"].values) == 7.0
+    assert len(bk.facts["test2"]) == 1
+    assert bk.facts["test2"].arity == 2
+    assert len(bk.facts["test3"]) == 3
+    assert bk.facts["test3"].arity == 3
+    assert bk.facts.decode(bk.facts["test3"].columns[1]) == ["test3"] * 3
+    assert sum(bk.facts["test3"].weights) == 7.0
 
 
 def test_prover():
@@ -174,3 +186,532 @@ def test_prover_family_example():
         ],
     )
     assert result == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_prove_batch():
+    facts = [
+        "2.0::actor(john).",
+        "actor(maria).",
+        "director(isaac).",
+        "3.4::movie(movie1, john).",
+        "movie(movie1, isaac).",
+    ]
+
+    prover = Prover(facts)
+    head_mappings = [
+        {"A": ["john"], "B": ["isaac"]},
+        {"A": ["john"], "B": ["maria"]},
+        {"A": ["pedro"], "B": ["isaac"]},
+    ]
+    clauses = [
+        [
+            Literal(Predicate("actor"), [Variable("A")]),
+            Literal(Predicate("director"), [Variable("B")]),
+            Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+            Literal(Predicate("movie"), [Variable("C"), Variable("B")]),
+        ],
+        [
+            Literal(Predicate("movie"), [Variable("C"), Variable("D")]),
+            Literal(Predicate("movie"), [Variable("C"), Constant("test")]),
+        ],
+        [
+            Literal(Predicate("movie"), [Variable("_"), Variable("A")]),
+            Literal(Predicate("writer"), [Variable("A")]),
+        ],
+        [
+            Literal(Predicate("movie"), [Constant("movie1"), Variable("C")]),
+            Literal(Predicate("movie"), [Variable("D"), Variable("C")]),
+            Literal(Predicate("actor"), [Variable("C")]),
+        ],
+    ]
+    for clause in clauses:
+        result = prover.prove_batch(head_mappings, clause)
+        assert result.shape == (len(head_mappings), len(clause))
+        for row, head_mapping in zip(result, head_mappings):
+            assert row.tolist() == prover.prove(head_mapping, clause)
+
+
+def test_prove_batch_random_clauses():
+    random.seed(0)
+    background = [
+        "male(+name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "siblingof(+name,-name).",
+        "siblingof(`name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(jamespotter).",
+        "male(harrypotter).",
+        "male(arthurweasley).",
+        "male(ronweasley).",
+        "male(fredweasley).",
+        "siblingof(ronweasley,fredweasley).",
+        "siblingof(fredweasley,ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+        "siblingof(ginnyweasley,ronweasley).",
+        "0.5::childof(jamespotter,harrypotter).",
+        "childof(lilypotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+        "childof(arthurweasley,fredweasley).",
+        "childof(arthurweasley,ginnyweasley).",
+    ]
+    head_mappings = [
+        {"A": [a], "B": [b]}
+        for a in ["harrypotter", "ronweasley", "ginnyweasley", "hedwig"]
+        for b in ["jamespotter", "arthurweasley", "mollyweasley"]
+    ]
+    prover = Prover(facts)
+    factory = ClauseFactory(background, facts, "father")
+    for _ in range(50):
+        clause = factory.get_clause()
+        result = prover.prove_batch(head_mappings, clause)
+        for row, head_mapping in zip(result, head_mappings):
+            assert row.tolist() == pytest.approx(
+                prover.prove(head_mapping, clause)
+            )
+
+
+def test_prover_loaded_store(tmp_path):
+    facts = [
+        "2.0::actor(john).",
+        "actor(maria).",
+        "director(isaac).",
+        "3.4::movie(movie1, john).",
+        "movie(movie1, isaac).",
+    ]
+    clause = [
+        Literal(Predicate("actor"), [Variable("A")]),
+        Literal(Predicate("director"), [Variable("B")]),
+        Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+        Literal(Predicate("movie"), [Variable("C"), Variable("B")]),
+    ]
+    FactStore(facts).save(str(tmp_path))
+    prover = Prover(FactStore.load(str(tmp_path)))
+    head_mapping = {"A": ["john"], "B": ["isaac"]}
+    assert prover.prove(head_mapping, clause) == [2.0, 1.0, 3.4, 1.0]
+    assert prover.prove_batch([head_mapping], clause).tolist() == [
+        [2.0, 1.0, 3.4, 1.0]
+    ]
+
+
+def test_prover_literal_cache():
+    facts = [
+        "2.0::actor(john).",
+        "actor(maria).",
+        "director(isaac).",
+        "3.4::movie(movie1, john).",
+        "movie(movie1, isaac).",
+    ]
+    clause = [
+        Literal(Predicate("actor"), [Variable("A")]),
+        Literal(Predicate("director"), [Variable("B")]),
+        Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+        Literal(Predicate("movie"), [Variable("C"), Variable("B")]),
+    ]
+    assert Prover(facts).cache_info() is None
+    prover = Prover(facts, cache_size=4)
+    head_mapping = {"A": ["john"], "B": ["isaac"]}
+    assert prover.prove(head_mapping, clause) == [2.0, 1.0, 3.4, 1.0]
+    assert prover.cache_info() == {
+        "hits": 0, "misses": 4, "size": 4, "maxsize": 4
+    }
+    assert prover.prove(head_mapping, clause) == [2.0, 1.0, 3.4, 1.0]
+    assert prover.cache_info()["hits"] == 4
+    assert prover.prove({"A": ["maria"], "B": ["isaac"]}, clause) == [
+        1.0, 1.0, 0.0, 0.0
+    ]
+    assert prover.cache_info()["hits"] == 5
+    assert prover.cache_info()["size"] == 4
+
+
+def test_prover_budgets():
+    facts = [
+        "movie(movie1,ana).",
+        "movie(movie1,bob).",
+        "0.5::movie(movie1,carl).",
+        "movie(movie2,ana).",
+        "actor(ana).",
+        "actor(bob).",
+    ]
+    clause = [
+        Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+        Literal(Predicate("movie"), [Variable("C"), Variable("D")]),
+        Literal(Predicate("actor"), [Variable("D")]),
+    ]
+    head_mapping = {"A": ["ana"]}
+    prover = Prover(facts)
+    assert prover.prove(head_mapping, clause) == pytest.approx([1.0, 0.875, 1.0])
+    assert prover.budget_hits == {}
+
+    # movie2 is dropped from the bindings of C, carl from the rows
+    prover = Prover(facts, max_bindings=1, max_rows=2)
+    assert prover.prove(head_mapping, clause) == [1.0, 1.0, 1.0]
+    assert prover.budget_hits == {
+        "movie(C, A), movie(C, D), actor(D)": {"bindings": 2, "rows": 1}
+    }
+    result = prover.prove_batch([head_mapping, {"A": ["bob"]}], clause[:1])
+    assert result.tolist() == [[1.0], [1.0]]
+    assert prover.budget_hits["movie(C, A)"] == {"bindings": 1, "rows": 0}
+
+
+def test_prove_batch_budgets_random_clauses():
+    random.seed(1)
+    background = [
+        "male(+name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "siblingof(+name,-name).",
+        "siblingof(`name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(jamespotter).",
+        "male(harrypotter).",
+        "male(arthurweasley).",
+        "male(ronweasley).",
+        "male(fredweasley).",
+        "siblingof(ronweasley,fredweasley).",
+        "siblingof(fredweasley,ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+        "siblingof(ginnyweasley,ronweasley).",
+        "0.5::childof(jamespotter,harrypotter).",
+        "childof(lilypotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(mollyweasley,ronweasley).",
+        "childof(arthurweasley,fredweasley).",
+        "childof(arthurweasley,ginnyweasley).",
+    ]
+    head_mappings = [
+        {"A": [a], "B": [b]}
+        for a in ["harrypotter", "ronweasley", "ginnyweasley", "hedwig"]
+        for b in ["jamespotter", "arthurweasley", "mollyweasley"]
+    ]
+    factory = ClauseFactory(background, facts, "father")
+    clauses = factory.get_clauses(50)
+    scalar = Prover(facts, max_bindings=1, max_rows=1)
+    batch = Prover(facts, max_bindings=1, max_rows=1)
+    for clause in clauses:
+        result = batch.prove_batch(head_mappings, clause)
+        for row, head_mapping in zip(result, head_mappings):
+            assert row.tolist() == pytest.approx(
+                scalar.prove(head_mapping, clause)
+            )
+    assert scalar.budget_hits
+    assert batch.budget_hits == scalar.budget_hits
+    trie = Prover(facts, max_bindings=1, max_rows=1)
+    trie.prove_trie(head_mappings, ClauseTrie(clauses))
+    assert trie.budget_hits == scalar.budget_hits
+
+
+def test_prove_exact_trie_budgets():
+    facts = [
+        "pair(a,x1).",
+        "pair(a,x2).",
+        "link(x2,y2).",
+        "link(x2,y3).",
+        "link(x1,y1).",
+        "check(y3).",
+        "check(x1).",
+    ]
+    pair = Literal(Predicate("pair"), [Variable("A"), Variable("X")])
+    link = Literal(Predicate("link"), [Variable("X"), Variable("Y")])
+    clauses = [
+        [pair, link, Literal(Predicate("check"), [Variable("Y")])],
+        [pair, link, Literal(Predicate("check"), [Variable("X")])],
+    ]
+    head_mappings = [{"A": ["a"]}, {"A": ["b"]}]
+    prover = Prover(facts, exact=True, max_bindings=2)
+    # the first two Y alone are y2 and y3, the first two (X, Y) pairs
+    # bind y1 and y2
+    expected = np.hstack([
+        prover.prove_batch(head_mappings, clause) for clause in clauses
+    ])
+    assert expected[0].tolist() == [1.0, 1.0, 1.0, 1.0, 1.0, 1.0]
+    result = prover.prove_trie(head_mappings, ClauseTrie(clauses))
+    assert result.tolist() == expected.tolist()
+    assert [
+        prover.prove(head_mappings[0], clause) for clause in clauses
+    ] == [[1.0, 1.0, 1.0], [1.0, 1.0, 1.0]]
+    sparse = prover.prove_trie(head_mappings, ClauseTrie(clauses), True)
+    assert sparse.toarray().tolist() == expected.tolist()
+
+
+def _prove_by_enumeration(facts, head_mapping, clause):
+    """Exact features of a clause by enumerating its groundings"""
+    parsed = [get_literal(fact) for fact in facts]
+    substitutions = [
+        {variable: values[0] for variable, values in head_mapping.items()}
+    ]
+    features = []
+    for literal in clause:
+        matched, extended = set(), []
+        for substitution in substitutions:
+            for index, (weight, predicate, arguments) in enumerate(parsed):
+                if predicate != literal.predicate.name:
+                    continue
+                if len(arguments) != len(literal.arguments):
+                    continue
+                binding = dict(substitution)
+                for term, value in zip(literal.arguments, arguments):
+                    if isinstance(term, Constant):
+                        if term.name != value:
+                            break
+                    elif term.name == "_":
+                        continue
+                    elif binding.setdefault(term.name, value) != value:
+                        break
+                else:
+                    matched.add(index)
+                    extended.append(binding)
+        if not matched:
+            break
+        features.append(
+            sum(parsed[index][0] for index in matched) / len(matched)
+        )
+        substitutions = extended
+    return features + [0.0] * (len(clause) - len(features))
+
+
+def test_prove_exact():
+    facts = [
+        "pair(a,x1).",
+        "0.5::pair(a,x2).",
+        "link(x1,y1).",
+        "0.2::link(x2,y2).",
+        "check(x1,y2).",
+        "check(x2,y2).",
+    ]
+    clause = [
+        Literal(Predicate("pair"), [Variable("A"), Variable("X")]),
+        Literal(Predicate("link"), [Variable("X"), Variable("Y")]),
+        Literal(Predicate("check"), [Variable("X"), Variable("Y")]),
+    ]
+    head_mapping = {"A": ["a"]}
+    # the approximate prover binds X and Y independently
+    assert Prover(facts).prove(head_mapping, clause) == \
+        pytest.approx([0.75, 0.6, 1.0])
+    prover = Prover(facts, exact=True)
+    assert prover.prove(head_mapping, clause) == \
+        pytest.approx([0.75, 0.6, 1.0])
+    facts.pop()
+    assert Prover(facts).prove(head_mapping, clause) == \
+        pytest.approx([0.75, 0.6, 1.0])
+    prover = Prover(facts, exact=True)
+    assert prover.prove(head_mapping, clause) == \
+        pytest.approx([0.75, 0.6, 0.0])
+    clause[2] = Literal(Predicate("check"), [Variable("X"), Constant("y2")])
+    assert prover.prove(head_mapping, clause) == \
+        pytest.approx([0.75, 0.6, 1.0])
+    assert prover.prove({"A": ["b"]}, clause) == [0.0, 0.0, 0.0]
+
+
+def test_unique_rows():
+    table = np.array([[1, 5], [0, -1], [1, 5], [0, 2]])
+    rows, inverse = unique_rows(table, return_inverse=True)
+    assert rows.tolist() == [[0, -1], [0, 2], [1, 5]]
+    assert rows[inverse].tolist() == table.tolist()
+    # too wide for one integer per row
+    table = np.array([[2 ** 40, 0, 2 ** 40], [0, 2 ** 40, 0], [0, 0, 0]])
+    assert unique_rows(table).tolist() == \
+        np.unique(table, axis=0).tolist()
+    left, right = match_keys(np.array([3, 1, 2]), np.array([1, 3, 1]))
+    assert left.tolist() == [0, 1, 1]
+    assert right.tolist() == [1, 0, 2]
+
+
+def test_prove_exact_absent_predicate():
+    # the first literal binds C but has no facts to bind it to
+    clause = [
+        Literal(Predicate("parentof"), [Variable("A"), Variable("C")]),
+        Literal(Predicate("male"), [Variable("C")]),
+    ]
+    head_mappings = [{"A": ["harry"]}, {"A": ["ron"]}]
+    prover = Prover(["male(harry).", "male(ron)."], exact=True)
+    assert prover.prove(head_mappings[0], clause) == [0.0, 0.0]
+    assert prover.prove_batch(head_mappings, clause).tolist() == \
+        [[0.0, 0.0], [0.0, 0.0]]
+    assert prover.prove_trie(head_mappings, ClauseTrie([clause])).tolist() \
+        == [[0.0, 0.0], [0.0, 0.0]]
+
+
+@pytest.mark.parametrize("block_size", [1, JoinStep.block_size])
+def test_prove_exact_random_clauses(monkeypatch, block_size):
+    # keys are probed in blocks that never split a sample
+    monkeypatch.setattr(JoinStep, "block_size", block_size)
+    random.seed(2)
+    background = [
+        "male(+name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "childof(-name,-name).",
+        "siblingof(+name,-name).",
+        "siblingof(`name,+name).",
+        "siblingof(+name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(jamespotter).",
+        "male(harrypotter).",
+        "male(arthurweasley).",
+        "male(ronweasley).",
+        "male(fredweasley).",
+        "siblingof(ronweasley,fredweasley).",
+        "siblingof(fredweasley,ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+        "siblingof(ginnyweasley,ronweasley).",
+        "0.5::childof(jamespotter,harrypotter).",
+        "childof(lilypotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "0.2::childof(mollyweasley,ronweasley).",
+        "childof(arthurweasley,fredweasley).",
+        "childof(arthurweasley,ginnyweasley).",
+    ]
+    head_mappings = [
+        {"A": [a], "B": [b]}
+        for a in ["harrypotter", "ronweasley", "ginnyweasley", "hedwig"]
+        for b in ["jamespotter", "arthurweasley", "mollyweasley"]
+    ]
+    clauses = ClauseFactory(background, facts, "father").get_clauses(40)
+    prover = Prover(facts, exact=True)
+    expected = np.hstack([
+        [
+            _prove_by_enumeration(facts, head_mapping, clause)
+            for head_mapping in head_mappings
+        ]
+        for clause in clauses
+    ])
+    result = np.hstack([
+        prover.prove_batch(head_mappings, clause) for clause in clauses
+    ])
+    assert np.count_nonzero(expected) > len(clauses)
+    np.testing.assert_allclose(result, expected)
+    result = prover.prove_trie(head_mappings, ClauseTrie(clauses))
+    np.testing.assert_allclose(result, expected)
+    assert [
+        prover.prove(head_mappings[3], clause) for clause in clauses
+    ] == [
+        pytest.approx(_prove_by_enumeration(facts, head_mappings[3], clause))
+        for clause in clauses
+    ]
+
+
+def test_prover_profiler():
+    facts = [
+        "movie(movie1,john).",
+        "movie(movie1,isaac).",
+        "movie(movie2,john).",
+        "actor(john).",
+        "director(isaac).",
+    ]
+    clause = [
+        Literal(Predicate("movie"), [Variable("B"), Variable("A")]),
+        Literal(Predicate("movie"), [Variable("B"), Variable("C")]),
+        Literal(Predicate("director"), [Variable("C")]),
+    ]
+
+    def literals(profiler, index=0):
+        return [
+            (literal["calls"], literal["rows"], literal["bindings"])
+            for literal in profiler.report()["clauses"][index]["literals"]
+        ]
+
+    profiler = Profiler()
+    prover = Prover(facts, profiler=profiler)
+    prover.prove({"A": ["john"]}, clause)
+    assert literals(profiler) == [(1, 2, 3), (1, 3, 4), (1, 1, 1)]
+    prover.prove_batch([{"A": ["john"]}], clause)
+    assert literals(profiler) == [(2, 4, 6), (2, 6, 8), (2, 2, 2)]
+
+    # a shared prefix counts towards every clause below it
+    profiler = Profiler()
+    prover.profiler = profiler
+    other = clause[:2] + [Literal(Predicate("actor"), [Variable("C")])]
+    prover.prove_trie([{"A": ["john"]}], ClauseTrie([clause, other]))
+    report = profiler.report()
+    assert len(report["clauses"]) == 2
+    assert literals(profiler) == [(1, 2, 3), (1, 3, 4), (1, 1, 1)]
+    assert literals(profiler, 1) == [(1, 2, 3), (1, 3, 4), (1, 1, 1)]
+    assert report["clauses"][0]["seconds"] >= report["clauses"][1]["seconds"]
+
+    # the exact mode counts the rows of the joined tables
+    profiler = Profiler()
+    prover = Prover(facts, exact=True, profiler=profiler)
+    prover.prove_batch([{"A": ["john"]}], clause)
+    assert literals(profiler) == [(1, 2, 2), (1, 3, 2), (1, 1, 1)]
+    prover.profiler = None
+    prover.prove({"A": ["john"]}, clause)
+    assert literals(profiler) == [(1, 2, 2), (1, 3, 2), (1, 1, 1)]
+
+
+@pytest.mark.parametrize("min_compaction_rows", [0, 1024])
+def test_prover_add_remove_facts_random_clauses(
+    monkeypatch, min_compaction_rows
+):
+    from deeprelnn.store import Relation
+
+    monkeypatch.setattr(Relation, "min_compaction_rows", min_compaction_rows)
+    random.seed(6)
+    background = [
+        "male(+name).",
+        "male(-name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "childof(-name,-name).",
+        "siblingof(+name,-name).",
+        "siblingof(`name,+name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(jamespotter).",
+        "male(harrypotter).",
+        "male(arthurweasley).",
+        "0.5::childof(jamespotter,harrypotter).",
+        "childof(lilypotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+    ]
+    added = [
+        "male(ronweasley).",
+        "0.0::male(fredweasley).",
+        "siblingof(ronweasley,fredweasley).",
+        "siblingof(fredweasley,ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+        "childof(mollyweasley,ronweasley).",
+        "childof(arthurweasley,fredweasley).",
+        "childof(arthurweasley,ginnyweasley).",
+    ]
+    removed = [
+        "male(harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+    ]
+    head_mappings = [
+        {"A": [a], "B": [b]}
+        for a in ["harrypotter", "ronweasley", "ginnyweasley", "hedwig"]
+        for b in ["jamespotter", "arthurweasley", "mollyweasley"]
+    ]
+    clauses = ClauseFactory(
+        background, facts + added, "father"
+    ).get_clauses(60)
+    trie = ClauseTrie(clauses)
+    for options in [{"cache_size": 100}, {"exact": True}]:
+        prover = Prover(facts, **options)
+        # fill the caches built on the old facts
+        prover.prove_trie(head_mappings, trie)
+        prover.add_facts(added)
+        assert prover.remove_facts(removed) == 3
+        assert prover.remove_facts(["male(hedwig)."]) == 0
+        expected = Prover(
+            [fact for fact in facts + added if fact not in removed],
+            **options
+        )
+        assert prover.prove_trie(head_mappings, trie).tolist() == \
+            expected.prove_trie(head_mappings, trie).tolist()
+        for clause in clauses:
+            proved = prover.prove_batch(head_mappings, clause)
+            assert proved.tolist() == \
+                expected.prove_batch(head_mappings, clause).tolist()
+            assert prover.prove(head_mappings[4], clause) == \
+                proved[4].tolist()
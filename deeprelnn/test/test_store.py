@@ -0,0 +1,304 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from deeprelnn.store import (
+    ArgumentIndex,
+    FactStore,
+    Relation,
+    get_fingerprint,
+)
+
+
+def test_fact_store_interning():
+    facts = [
+        "actor(john).",
+        "2.0::movie(movie1, john).",
+        "movie(movie1, isaac).",
+    ]
+    store = FactStore(facts)
+    assert store.constants == ["john", "movie1", "isaac"]
+    assert store.constant_ids["isaac"] == 2
+    assert "actor" in store
+    assert "director" not in store
+    assert store["movie"].arity == 2
+    assert len(store["movie"]) == 2
+    assert store["movie"].columns[0].tolist() == [1, 1]
+    assert store["movie"].columns[1].tolist() == [0, 2]
+    assert store["movie"].weights.tolist() == [2.0, 1.0]
+
+
+def test_fact_store_encode_decode():
+    store = FactStore(["actor(john).", "actor(maria)."])
+    assert store.encode(["maria", "pedro", "john"]).tolist() == [1, -1, 0]
+    assert store.decode([1, 0]) == ["maria", "john"]
+
+
+def test_fact_store_inconsistent_arity():
+    with pytest.raises(ValueError):
+        FactStore(["movie(movie1, john).", "movie(movie1)."])
+
+
+def test_argument_index_lookup():
+    index = ArgumentIndex.from_keys(np.array([3, 1, 3, 2, 1, 3]))
+    assert index.lookup(np.array([3])).tolist() == [0, 2, 5]
+    assert index.lookup(np.array([1, 2])).tolist() == [1, 3, 4]
+    assert index.lookup(np.array([7, -1])).tolist() == []
+    assert ArgumentIndex.from_keys(np.array([], dtype=np.int64)).lookup(
+        np.array([1])
+    ).tolist() == []
+
+
+def test_relation_select():
+    facts = [
+        "movie(movie1, john).",
+        "movie(movie1, isaac).",
+        "movie(movie2, john).",
+        "movie(movie2, maria).",
+    ]
+    store = FactStore(facts)
+    relation = store["movie"]
+    assert relation.composite is not None
+    movie1, john, isaac, movie2, maria = range(5)
+    assert relation.select({}).tolist() == [0, 1, 2, 3]
+    assert relation.select({1: np.array([john])}).tolist() == [0, 2]
+    assert relation.select(
+        {0: np.array([movie2]), 1: np.array([john, maria])}
+    ).tolist() == [2, 3]
+    assert relation.select(
+        {0: np.array([movie1]), 1: np.array([maria])}
+    ).tolist() == []
+    assert relation.select({0: np.array([-1])}).tolist() == []
+    relation.composite = None
+    assert relation.select(
+        {0: np.array([movie2]), 1: np.array([john, maria])}
+    ).tolist() == [2, 3]
+
+
+def test_argument_index_probe():
+    index = ArgumentIndex.from_keys(np.array([3, 1, 3, 2, 1, 3]))
+    positions, rows = index.probe(np.array([1, 7, 3, 1]))
+    assert positions.tolist() == [0, 0, 2, 2, 2, 3, 3]
+    assert rows.tolist() == [1, 4, 0, 2, 5, 1, 4]
+
+
+def test_get_fingerprint():
+    facts = ["actor(john).", "actor(maria)."]
+    assert get_fingerprint(facts) == get_fingerprint(list(facts))
+    assert get_fingerprint(facts) != get_fingerprint(facts[::-1])
+    assert get_fingerprint(["ab", "c"]) != get_fingerprint(["a", "bc"])
+
+
+def test_fact_store_save_load(tmp_path):
+    facts = [
+        "actor(john).",
+        "2.0::movie(movie1, john).",
+        "movie(movie1, isaac).",
+        "0.5::knows(john, isaac, maria).",
+    ]
+    store = FactStore(facts)
+    store.save(str(tmp_path))
+    loaded = FactStore.load(str(tmp_path))
+    assert loaded.n_constants == 4
+    assert loaded._constants is None
+    assert isinstance(loaded["movie"].columns[0], np.memmap)
+    assert isinstance(loaded["movie"].indexes[1].rows, np.memmap)
+    assert loaded["movie"].select({1: np.array([2])}).tolist() == [1]
+    assert loaded["knows"].composite is not None
+    assert loaded["knows"].weights.tolist() == [0.5]
+    assert loaded.constants == store.constants
+    assert loaded.encode(["isaac", "pedro"]).tolist() == [2, -1]
+    assert sorted(loaded.relations) == ["actor", "knows", "movie"]
+    for name, relation in store.relations.items():
+        assert loaded[name].radix == relation.radix
+        for column, loaded_column in zip(
+            relation.columns, loaded[name].columns
+        ):
+            assert column.tolist() == loaded_column.tolist()
+
+    loaded = FactStore.load(str(tmp_path), mmap_mode=None)
+    assert not isinstance(loaded["movie"].columns[0], np.memmap)
+
+
+def test_fact_store_chunked_compile():
+    facts = [
+        "actor(john).",
+        "2.0::movie(movie1, john).",
+        "actor(maria).",
+        "movie(movie1, isaac).",
+        "actor(isaac).",
+    ]
+    store = FactStore(iter(facts), chunk_size=2)
+    expected = FactStore(facts)
+    assert store.constants == expected.constants
+    assert store["actor"].columns[0].tolist() == [0, 2, 3]
+    assert store["movie"].columns[1].tolist() == [0, 3]
+    assert store["movie"].weights.tolist() == [2.0, 1.0]
+    with pytest.raises(ValueError):
+        FactStore(["movie(movie1, john).", "movie(movie1)."], chunk_size=1)
+
+
+def test_fact_store_from_file(tmp_path):
+    facts = ["actor(john).", "", "2.0::movie(movie1, john)."]
+    path = tmp_path / "facts.pl"
+    path.write_text("\n".join(facts))
+    compressed = tmp_path / "facts.pl.gz"
+    with gzip.open(compressed, "wt") as file:
+        file.write("\n".join(facts))
+    for source in [path, compressed]:
+        store = FactStore.from_file(str(source))
+        assert store.constants == ["john", "movie1"]
+        assert store["movie"].weights.tolist() == [2.0]
+    path.write_text("male(a).\n\n\nmale(b\n")
+    with pytest.raises(ValueError, match="lines 4$"):
+        FactStore.from_file(str(path), chunk_size=1)
+    with pytest.raises(ValueError, match="lines 4$"):
+        FactStore.from_file(str(path))
+
+
+def test_fact_store_fingerprint(tmpdir):
+    facts = ["male(harrypotter).", "childof(jamespotter,harrypotter)."]
+    store = FactStore(facts)
+    assert store.fingerprint == FactStore(facts).fingerprint
+    assert store.fingerprint != FactStore(facts[:1]).fingerprint
+    assert store.fingerprint != FactStore(
+        ["0.5::male(harrypotter).", facts[1]]
+    ).fingerprint
+    path = str(tmpdir.join("store"))
+    store.save(path)
+    assert FactStore.load(path).fingerprint == store.fingerprint
+
+
+def test_relation_statistics():
+    store = FactStore([
+        "movie(movie1,ana).",
+        "movie(movie1,bob).",
+        "movie(movie1,carl).",
+        "movie(movie2,ana).",
+        "actor(ana).",
+    ])
+    assert store.get_statistics(top_k=1) == {
+        "movie": {
+            "rows": 4,
+            "arguments": [
+                {"distinct": 2, "top": [("movie1", 3)]},
+                {"distinct": 3, "top": [("ana", 2)]},
+            ],
+        },
+        "actor": {
+            "rows": 1,
+            "arguments": [{"distinct": 1, "top": [("ana", 1)]}],
+        },
+    }
+    relation = store["movie"]
+    movie1, movie2, bob = store.encode(["movie1", "movie2", "bob"]).tolist()
+    assert relation.estimate_rows({}) == 4
+    assert relation.estimate_rows({0: movie1}) == 3
+    assert relation.estimate_rows({0: movie2}) == 1
+    assert relation.estimate_rows({0: -1}) == 0
+    assert relation.estimate_rows({0: None}) == 2
+    assert relation.estimate_rows({0: movie1, 1: bob}) == 0.75
+
+
+def test_argument_index_tail():
+    index = ArgumentIndex.from_keys(np.array([3, 1, 3]))
+    index.set_tail(np.array([1, 2, 3]))
+    index.removed = np.array([2, 3])
+    assert index.lookup(np.array([1, 3])).tolist() == [0, 1, 5]
+    positions, rows = index.probe(np.array([3, 7, 1]))
+    assert positions.tolist() == [0, 0, 2]
+    assert rows.tolist() == [0, 5, 1]
+
+
+def test_fact_store_add_remove_facts(tmp_path):
+    def get_facts(store, predicate):
+        relation = store[predicate]
+        rows = relation.select({})
+        return sorted(zip(
+            relation.weights[rows].tolist(),
+            *[store.decode(column[rows]) for column in relation.columns]
+        ))
+
+    store = FactStore([
+        "movie(movie1, john).",
+        "movie(movie1, isaac).",
+        "movie(movie2, john).",
+        "movie(movie2, maria).",
+    ])
+    fingerprint = store.fingerprint
+    relation = store["movie"]
+    store.add_facts([
+        "movie(movie3, pedro).",
+        "0.5::movie(movie1, maria).",
+        "actor(john).",
+    ])
+    assert store.version == 1
+    assert store.n_constants == 7
+    assert store["movie"] is relation
+    assert len(relation) == 6 and relation.n_pending == 2
+    # the new ids do not fit the composite keys
+    assert relation.composite is None
+    assert get_facts(store, "actor") == [(1.0, "john")]
+    movie1, john, maria, pedro = store.encode(
+        ["movie1", "john", "maria", "pedro"]
+    ).tolist()
+    assert relation.select({0: np.array([movie1])}).tolist() == [0, 1, 5]
+    assert relation.select(
+        {0: np.array([movie1]), 1: np.array([maria])}
+    ).tolist() == [5]
+    positions, rows = relation.indexes[1].probe(np.array([pedro, john]))
+    assert positions.tolist() == [0, 1, 1]
+    assert rows.tolist() == [4, 0, 2]
+    assert store.fingerprint != fingerprint
+
+    assert store.remove_facts([
+        "movie(movie1, john).", "movie(nobody, john).", "director(john).",
+    ]) == 1
+    assert store.version == 2
+    assert relation.select({1: np.array([john])}).tolist() == [2]
+    assert relation.get_statistics()["rows"] == 5
+    assert store.get_constants({"movie": {1: "person"}}) == {
+        "person": {"isaac", "john", "maria", "pedro"}
+    }
+    expected = get_facts(store, "movie")
+    assert expected == [
+        (0.5, "movie1", "maria"),
+        (1.0, "movie1", "isaac"),
+        (1.0, "movie2", "john"),
+        (1.0, "movie2", "maria"),
+        (1.0, "movie3", "pedro"),
+    ]
+
+    store.save(str(tmp_path))
+    loaded = FactStore.load(str(tmp_path))
+    assert get_facts(loaded, "movie") == expected
+    assert loaded.fingerprint == store.fingerprint
+    assert relation.n_pending == 3
+    loaded.add_facts(["movie(movie4, ana)."])
+    assert len(get_facts(loaded, "movie")) == 6
+
+    fingerprint = store.fingerprint
+    store.compact()
+    assert store.version == 3
+    assert relation.n_pending == 0 and len(relation) == 5
+    assert relation.composite is not None
+    assert get_facts(store, "movie") == expected
+    assert store.fingerprint == fingerprint
+
+    with pytest.raises(ValueError):
+        store.add_facts(["movie(movie1)."])
+
+
+def test_fact_store_compaction(monkeypatch):
+    monkeypatch.setattr(Relation, "min_compaction_rows", 2)
+    store = FactStore(["edge(a, b).", "edge(b, c)."])
+    relation = store["edge"]
+    store.add_facts(["edge(c, d)."])
+    store.remove_facts(["edge(a, b)."])
+    assert relation.n_pending == 2
+    store.add_facts(["edge(d, e)."])
+    assert relation.n_pending == 0
+    assert len(relation) == 3
+    b, c, d = store.encode(["b", "c", "d"]).tolist()
+    assert relation.select({0: np.array([b, c, d])}).tolist() == [0, 1, 2]
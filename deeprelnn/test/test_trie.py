@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+
+from deeprelnn.factory import ClauseFactory
+from deeprelnn.fol import Literal, Predicate, Variable
+from deeprelnn.prover.prover import Prover
+from deeprelnn.prover.trie import ClauseTrie
+
+
+def test_clause_trie_shares_prefixes():
+    clauses = [
+        [
+            Literal(Predicate("actor"), [Variable("A")]),
+            Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+        ],
+        [
+            Literal(Predicate("actor"), [Variable("A")]),
+            Literal(Predicate("director"), [Variable("B")]),
+        ],
+        [
+            Literal(Predicate("actor"), [Variable("A")]),
+            Literal(Predicate("movie"), [Variable("C"), Variable("A")]),
+        ],
+    ]
+    trie = ClauseTrie(clauses)
+    assert trie.n_columns == 6
+    assert len(trie) == 3
+    actor = trie.root.children["actor(A)"]
+    assert actor.columns == [0, 2, 4]
+    assert actor.children["movie(C, A)"].columns == [1, 5]
+    assert actor.children["director(B)"].columns == [3]
+
+
+def test_prove_trie():
+    random.seed(1)
+    background = [
+        "male(+name).",
+        "childof(+name,-name).",
+        "childof(-name,+name).",
+        "siblingof(+name,-name).",
+        "father(+name,+name).",
+    ]
+    facts = [
+        "male(jamespotter).",
+        "male(harrypotter).",
+        "male(arthurweasley).",
+        "male(ronweasley).",
+        "siblingof(ronweasley,ginnyweasley).",
+        "siblingof(ginnyweasley,ronweasley).",
+        "0.5::childof(jamespotter,harrypotter).",
+        "childof(lilypotter,harrypotter).",
+        "childof(arthurweasley,ronweasley).",
+        "childof(arthurweasley,ginnyweasley).",
+    ]
+    head_mappings = [
+        {"A": [a], "B": [b]}
+        for a in ["harrypotter", "ronweasley", "ginnyweasley"]
+        for b in ["jamespotter", "arthurweasley", "lilypotter"]
+    ]
+    prover = Prover(facts)
+    factory = ClauseFactory(background, facts, "father", max_literals=3)
+    clauses = [factory.get_clause() for _ in range(40)]
+    trie = ClauseTrie(clauses)
+    assert len(trie) < 3 * len(clauses)
+    result = prover.prove_trie(head_mappings, trie)
+    expected = [prover.prove_batch(head_mappings, c) for c in clauses]
+    assert result.tolist() == [
+        [value for block in expected for value in block[row]]
+        for row in range(len(head_mappings))
+    ]
+    assert prover.prove_trie([], trie).shape == (0, trie.n_columns)
+
+    sparse = prover.prove_trie(head_mappings, trie, sparse=True)
+    assert sparse.format == "csr"
+    assert sparse.nnz == np.count_nonzero(result)
+    assert sparse.toarray().tolist() == result.tolist()
+    assert prover.prove_trie([], trie, sparse=True).shape == (
+        0, trie.n_columns
+    )
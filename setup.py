@@ -31,7 +31,7 @@ setup(
         "Topic :: Scientific/Engineering :: Artificial Intelligence",
     ],
     keywords="machine-learning-algorithms machine-learning statistical-learning pattern-classification artificial-intelligence",
-    install_requires=["numpy", "pandas", "tensorflow"],
+    install_requires=["numpy", "scipy", "tensorflow"],
     extras_require={
         "tests": ["pytest"],
     },